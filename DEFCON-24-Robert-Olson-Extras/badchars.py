@@ -0,0 +1,198 @@
+#Bad character analysis
+#
+#Instead of sending every byte 0x01-0xff in place of the shellcode and
+#reading the stack in the debugger byte by byte (then again after every
+#bad character removed), dump the memory where the bytes landed to a file
+#and let this compare it with what was sent:
+#
+#	python badchars.py create test.bin		(put this in the exploit
+#							 instead of the shellcode)
+#	... crash the target, in Immunity save the memory at ESP to dump.bin
+#	python badchars.py compare test.bin dump.bin
+#
+#The comparison is done on NumPy arrays: one vectorized != finds the first
+#divergence, a second one tries every shift of the next LOOKAHEAD bytes at
+#once to find where the two line up again, every byte in between is
+#reported as mangled (replaced, dropped or expanded), and the search
+#carries on from there. So a single dump reports every mangled byte at
+#once, unless one of them cut the string short (like \x00): that one has
+#to be removed and the test run again for the bytes after it.
+#
+#Needs NumPy (pip install numpy).
+
+import sys
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+from payload import BADCHARS
+
+#After a divergence, how far ahead to look for the sent and dumped bytes
+#lining up again, and how many bytes must agree for that to count. After a
+#truncation the dump is stack garbage, which can match any short run: with
+#every shift of LOOKAHEAD bytes tried, two bytes line up by chance in about
+#one dump in ten, four in less than one in a hundred thousand. Bad
+#characters closer together than MIN_RUN still come out right when they
+#were replaced, because the bytes between them that arrived intact are
+#not reported.
+LOOKAHEAD = 64
+MIN_RUN = 4
+
+
+def parse_bytes(text):
+	#"00,0a,0d", "000a0d" or "\x00\x0a\x0d" -> b"\x00\x0a\x0d"
+	return bytes.fromhex(text.replace("\\x", "").replace(",", "").replace(" ", ""))
+
+
+def test_string(exclude=BADCHARS):
+	#Every byte value, in order, except the ones already known to be bad
+	return bytes(byte for byte in range(256) if byte not in exclude)
+
+
+def locate(sent, dump):
+	#Offset of the sent buffer in the dump: where its first bytes are, or 0
+	#if the very first bytes are already mangled
+	offset = dump.find(sent[:MIN_RUN * 2])
+	return offset if offset >= 0 else 0
+
+
+def resync(sent, dump, i, j):
+	#After a divergence at sent[i] / dump[j], the first (a, b) with a > i
+	#from which MIN_RUN bytes (or every byte left) of sent[a:] and dump[b:]
+	#agree, or None if there is none within LOOKAHEAD. Every shift of the
+	#dump against the sent bytes is tried at once: row s of match is the
+	#dump shifted by shifts[s] (no shift first, then drops before
+	#expansions), column c is a = i + 1 + c.
+	k = numpy.arange(1, min(LOOKAHEAD, len(sent) - i))
+	if not len(k):
+		return None
+	shifts = numpy.array(sorted(range(-LOOKAHEAD, LOOKAHEAD + 1), key=abs))
+	match = numpy.ones((len(shifts), len(k)), bool)
+	for r in range(MIN_RUN):
+		a = i + k + r
+		b = j + k + r + shifts[:, None]
+		inside = a < len(sent)
+		valid = (b >= j) & (b < len(dump))
+		same = sent[numpy.minimum(a, len(sent) - 1)] == dump[numpy.clip(b, 0, len(dump) - 1)]
+		match &= (valid & same) | ~inside
+	columns = numpy.flatnonzero(match.any(axis=0))
+	if not len(columns):
+		return None
+	c = columns[0]
+	shift = shifts[numpy.flatnonzero(match[:, c])[0]]
+	return i + int(k[c]), j + int(k[c]) + int(shift)
+
+
+def compare(sent, dump):
+	#Compare two uint8 arrays. Returns (mangled, truncated): mangled is a
+	#list of (offset, sent byte, what the dump has instead), where instead
+	#is the bytes that replaced it (empty if it was dropped); truncated is
+	#the offset from which the dump no longer matches at all, or None.
+	mangled = []
+	i = j = 0
+	while i < len(sent):
+		n = min(len(sent) - i, len(dump) - j)
+		if n <= 0:
+			return mangled, i
+		diff = numpy.flatnonzero(sent[i:i + n] != dump[j:j + n])
+		if not len(diff):
+			i += n
+			j += n
+			continue
+		i += int(diff[0])
+		j += int(diff[0])
+
+		if i + 1 == len(sent):
+			#The last byte, nothing after it to line up
+			a, b = i + 1, j + 1
+		else:
+			found = resync(sent, dump, i, j)
+			if found is None:
+				return mangled, i
+			a, b = found
+
+		#Every sent byte up to where the two line up again is mangled:
+		#byte for byte as far as both go, then the last byte takes any
+		#extra dump bytes, or the sent bytes left over were dropped. When
+		#nothing was dropped or added, the bytes in between that arrived
+		#intact are not mangled.
+		if a - i == 1 and b - j == 2 and i > 0 and dump[j] == sent[i - 1] and dump[j + 1] == sent[i]:
+			#A copy of the previous byte was inserted: that byte was
+			#doubled, rather than this one expanded
+			mangled.append((i - 1, int(sent[i - 1]), bytes(dump[j - 1:j + 1])))
+		elif a - i == b - j:
+			for offset in range(i, a):
+				if sent[offset] != dump[j + offset - i]:
+					mangled.append((offset, int(sent[offset]), bytes(dump[j + offset - i:j + offset - i + 1])))
+		else:
+			for offset in range(i, a):
+				start = j + offset - i
+				end = b if offset == a - 1 else min(start + 1, b)
+				mangled.append((offset, int(sent[offset]), bytes(dump[min(start, b):end])))
+		i, j = a, b
+	return mangled, None
+
+
+def describe(byte, instead):
+	if not instead:
+		return "0x%02x dropped" % byte
+	return "0x%02x -> %s" % (byte, " ".join("0x%02x" % b for b in instead))
+
+
+if __name__ == "__main__":
+	try:
+		command = sys.argv[1]
+		if command not in ("create", "compare") or len(sys.argv) < (3 if command == "create" else 4):
+			raise ValueError(command)
+	except (IndexError, ValueError):
+		print("  USAGE: python badchars.py create <FILE> [KNOWN BAD]")
+		print("         python badchars.py compare <SENT FILE> <DUMP FILE> [KNOWN BAD]")
+		print("EXAMPLE: python badchars.py create test.bin 00,0a")
+		print("         python badchars.py compare test.bin dump.bin 00,0a")
+		exit()
+
+	if command == "create":
+		known = parse_bytes(sys.argv[3]) if len(sys.argv) > 3 else BADCHARS
+		with open(sys.argv[2], "wb") as f:
+			f.write(test_string(known))
+		exit()
+
+	if numpy is None:
+		print("badchars.py compare needs NumPy: pip install numpy")
+		exit(1)
+
+	known = parse_bytes(sys.argv[4]) if len(sys.argv) > 4 else BADCHARS
+	with open(sys.argv[2], "rb") as f:
+		sent = f.read()
+	with open(sys.argv[3], "rb") as f:
+		dump = f.read()
+	start = locate(sent, dump)
+	print("Sent %i bytes, comparing from offset %i of the %i byte dump" % (len(sent), start, len(dump)))
+
+	mangled, truncated = compare(numpy.frombuffer(sent, numpy.uint8), numpy.frombuffer(dump, numpy.uint8)[start:])
+	if not mangled and truncated is None:
+		print("No bad characters, every byte arrived intact")
+		exit()
+
+	first = mangled[0][0] if mangled else truncated
+	print("First divergence at byte %i (sent 0x%02x)" % (first, sent[first]))
+
+	#Every sent byte value seen mangled, with each way it was mangled
+	found = {}
+	for offset, byte, instead in mangled:
+		found.setdefault(byte, []).append((offset, instead))
+	for byte in sorted(found):
+		kinds = sorted(set(instead for offset, instead in found[byte]))
+		offsets = ", ".join(str(offset) for offset, instead in found[byte])
+		print("\t%s\tat %s" % ("; ".join(describe(byte, instead) for instead in kinds), offsets))
+	bad = set(found)
+	if truncated is not None:
+		bad.add(sent[truncated])
+		print("\t0x%02x\tat %i: the dump stops matching here, so this byte most likely cut the" % (sent[truncated], truncated))
+		print("\t\tstring short. Remove it and run again to test the %i bytes after it." % (len(sent) - truncated - 1))
+
+	bad = sorted(bad | set(known))
+	print("Bad characters: %s" % "".join("\\x%02x" % byte for byte in bad))
+	print("msfvenom ... -b '%s'" % "".join("\\x%02x" % byte for byte in bad))
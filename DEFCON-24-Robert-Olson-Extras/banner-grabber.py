@@ -1,26 +1,74 @@
+import asyncio
 import socket
 import sys
+import time
+
+from banner_grab import grab_banner
+from fingerprints import FingerprintIndex
+from scan_cache import ResultCache
+from scan_engine import CLOSED, FILTERED, OPEN, ScanResult
 
 try:
 	ip = sys.argv[1]
 	port = int(sys.argv[2])
-
 except:
-	print "  USAGE:\tpython banner-grabber.py <IPv4_Address> <PORT_NUMBER>"
-	print "EXAMPLE:\tpython banner-grabber.py 192.168.1.1 80"
+	print("  USAGE:\tpython banner-grabber.py <IPv4_Address> <PORT_NUMBER> [TIMEOUT] [CACHE]")
+	print("EXAMPLE:\tpython banner-grabber.py 192.168.1.1 80")
+	print("EXAMPLE:\tpython banner-grabber.py 192.168.1.1 80 2 lab.db")
+	exit()
+
+#Seconds to wait for the connect and for each read
+timeout = float(sys.argv[3]) if len(sys.argv) > 3 else 2.0
+
 
+async def main():
+	loop = asyncio.get_running_loop()
 
-#Create an instance of type socket called conn
-conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	#Create an instance of type socket called conn. It is non-blocking, so
+	#every step below can be given a timeout instead of hanging forever.
+	conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	conn.setblocking(False)
 
-#Connect to the IP/port provided at the command line
-conn.connect((ip, port))
+	#Connect to the IP/port provided at the command line
+	try:
+		await asyncio.wait_for(loop.sock_connect(conn, (ip, port)), timeout)
+	except asyncio.TimeoutError:
+		print("Port %i is filtered." % port)
+		return ScanResult(ip, port, FILTERED, None)
+	except OSError:
+		print("Port %i is closed." % port)
+		return ScanResult(ip, port, CLOSED, None)
 
-#Read the first 1024 bytes of data and print them to the screen
-print conn.recv(1024)
+	#Read up to the first 1024 bytes of data. If the service waits for us
+	#to speak first (e.g. HTTP), a small probe is sent to get an answer.
+	try:
+		banner = await grab_banner(conn, port, timeout, 1024)
+	finally:
+		#Close the connection
+		conn.close()
 
-#Close the connection
-conn.close() 
+	print(banner.decode("latin-1"))
+	return ScanResult(ip, port, OPEN, None, banner)
 
 
+result = asyncio.run(main())
 
+#With a CACHE file (the same one port-scanner.py --cache uses), say what
+#changed since the port was last checked and remember this result
+if len(sys.argv) > 4:
+	cache = ResultCache(sys.argv[4])
+	if result.banner is not None:
+		service, version = FingerprintIndex.load().match(result.banner)
+		result = result._replace(service=service, version=version)
+	entry = cache.get("connect", ip, port)
+	if entry is None:
+		print("(not in the cache yet)")
+	elif entry.state != result.state:
+		print("(changed: was %s when last checked, %s)" % (entry.state, time.ctime(entry.checked)))
+	elif result.banner is not None and result.banner != entry.banner:
+		print("(banner changed since %s, was: %s)" % (time.ctime(entry.checked),
+			(entry.banner or b"").decode("latin-1").strip().split("\n", 1)[0]))
+	else:
+		print("(unchanged, last checked %s)" % time.ctime(entry.checked))
+	cache.record("connect", result)
+	cache.close()
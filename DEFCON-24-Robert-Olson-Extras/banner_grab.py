@@ -0,0 +1,65 @@
+#Banner grabbing on an already connected, non-blocking socket
+#
+#Used by banner-grabber.py and by port-scanner.py --banners, which hands
+#over the socket the scan just opened instead of connecting a second time.
+#
+#Many services (FTP, SSH, SMTP, VulnServer) speak first, so we just read.
+#Others (HTTP) wait for the client; if nothing arrives before the read
+#timeout we send a small probe and read again.
+
+import asyncio
+
+HTTP_HEAD = b"HEAD / HTTP/1.0\r\n\r\n"
+
+#Probes for services that wait for the client to speak first
+PROBES = {
+	80: HTTP_HEAD,
+	81: HTTP_HEAD,
+	591: HTTP_HEAD,
+	3000: HTTP_HEAD,
+	5000: HTTP_HEAD,
+	8000: HTTP_HEAD,
+	8008: HTTP_HEAD,
+	8080: HTTP_HEAD,
+	8081: HTTP_HEAD,
+	8888: HTTP_HEAD,
+}
+
+#Sent to silent ports that have no entry in PROBES. A HEAD request is a
+#harmless way to get an answer out of most line based services too.
+DEFAULT_PROBE = HTTP_HEAD
+
+
+async def read_banner(conn, timeout, max_bytes):
+	#Wait up to `timeout` for the first bytes, then keep reading for as long
+	#as more data follows within a quarter of that, stopping at max_bytes
+	#or when the peer closes the connection.
+	loop = asyncio.get_running_loop()
+	data = b""
+	wait = timeout
+	while len(data) < max_bytes:
+		try:
+			chunk = await asyncio.wait_for(loop.sock_recv(conn, max_bytes - len(data)), wait)
+		except (asyncio.TimeoutError, OSError):
+			break
+		if not chunk:
+			break
+		data += chunk
+		wait = timeout / 4
+	return data
+
+
+async def grab_banner(conn, port, timeout=2.0, max_bytes=1024, probes=PROBES, default_probe=DEFAULT_PROBE):
+	banner = await read_banner(conn, timeout, max_bytes)
+	if banner:
+		return banner
+
+	probe = probes.get(port, default_probe)
+	if probe is None:
+		return banner
+	loop = asyncio.get_running_loop()
+	try:
+		await asyncio.wait_for(loop.sock_sendall(conn, probe), timeout)
+	except (asyncio.TimeoutError, OSError):
+		return banner
+	return await read_banner(conn, timeout, max_bytes)
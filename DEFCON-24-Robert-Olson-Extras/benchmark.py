@@ -0,0 +1,212 @@
+#Throughput benchmarks for the scan and fuzz engines
+#
+#Starts vulnserver_sim.py on loopback and runs the engines behind
+#port-scanner.py and fuzzer.py against it under fixed conditions:
+#
+#	open      - every scanned port is listening
+#	closed    - nothing listens on any scanned port
+#	filtered  - every scanned port silently drops SYNs
+#	mixed     - open, slow (delayed banner), closed and filtered ports,
+#	            with banner grabbing on
+#	fuzz      - TRUN length sweep below the crash length
+#	fuzz-slow - the same against a port with delayed replies
+#
+#For each it reports probes per second, p50/p99 probe latency and peak
+#memory (max RSS of the process that ran it), and appends the run to
+#bench-results.jsonl so the next run can be compared against it.
+#
+#Usage: python benchmark.py [scenario ...]
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import fuzz_engine
+from banner_grab import grab_banner
+from scan_engine import Scanner, raise_fd_limit, run_pool
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS = os.path.join(HERE, "bench-results.jsonl")
+HOST = "127.0.0.1"
+
+#Port layout of the simulator shared by all scenarios
+OPEN = range(20000, 21000)
+CLOSED = range(22000, 23000)
+FILTERED = range(24000, 24200)
+SLOW = range(25000, 25100)
+SLOW_LATENCY = .05
+SLOW_JITTER = .04
+
+SCENARIOS = {
+	"open": dict(kind="scan", ports=list(OPEN)),
+	"closed": dict(kind="scan", ports=list(CLOSED)),
+	"filtered": dict(kind="scan", ports=list(FILTERED), timeout=.2),
+	"mixed": dict(kind="scan", banners=True, timeout=.2, ports=
+		list(OPEN[:100]) + list(SLOW) + list(CLOSED[:100]) + list(FILTERED[:50])),
+	"fuzz": dict(kind="fuzz", port=OPEN[0], lengths=list(range(100, 2000, 2))),
+	"fuzz-slow": dict(kind="fuzz", port=SLOW[0], lengths=list(range(100, 2000, 10))),
+}
+
+
+def port_spec(ports):
+	return "%i-%i" % (ports[0], ports[-1])
+
+
+def start_sim():
+	sim = subprocess.Popen([sys.executable, os.path.join(HERE, "vulnserver_sim.py"),
+		"-p", port_spec(OPEN), "--filtered", port_spec(FILTERED),
+		"--slow", port_spec(SLOW), "--latency", str(SLOW_LATENCY), "--jitter", str(SLOW_JITTER)],
+		stdout=subprocess.DEVNULL)
+	deadline = time.monotonic() + 30
+	while time.monotonic() < deadline:
+		if sim.poll() is not None:
+			raise RuntimeError("vulnserver_sim.py exited with %i" % sim.returncode)
+		if all(asyncio.run(fuzz_engine.is_alive(HOST, port, 1.0)) for port in (OPEN[-1], SLOW[-1])):
+			return sim
+		time.sleep(.2)
+	sim.kill()
+	raise RuntimeError("vulnserver_sim.py did not come up")
+
+
+class TimedScanner(Scanner):
+
+	#Scanner that records how long every probe took, whatever its outcome
+
+	def __init__(self, *args, **kwargs):
+		Scanner.__init__(self, *args, **kwargs)
+		self.latencies = []
+
+	async def connect(self, host, port, attempt=0):
+		start = time.perf_counter()
+		result = await Scanner.connect(self, host, port, attempt)
+		self.latencies.append(time.perf_counter() - start)
+		return result
+
+
+async def run_scan(config, concurrency):
+	timeout = config.get("timeout", 1.0)
+	grab = grab_banner if config.get("banners") else None
+	scanner = TimedScanner(concurrency, timeout, timeout, timeout, 0, grab)
+	results = []
+	await scanner.scan(((HOST, port) for port in config["ports"]), results.append)
+	return scanner.latencies
+
+
+async def run_fuzz(config, concurrency):
+	latencies = []
+
+	async def worker(length):
+		start = time.perf_counter()
+		outcome = await fuzz_engine.send_case(HOST, config["port"], fuzz_engine.trun_case(length), 5.0)
+		latencies.append(time.perf_counter() - start)
+		if outcome != fuzz_engine.OK:
+			raise RuntimeError("unexpected %s at length %i" % (outcome, length))
+
+	await run_pool(config["lengths"], worker, concurrency)
+	return latencies
+
+
+def percentile(values, fraction):
+	values = sorted(values)
+	return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_scenario(name, concurrency):
+	#Runs in its own process (see --worker) so peak RSS is per scenario
+	import resource
+
+	config = SCENARIOS[name]
+	if config["kind"] == "scan":
+		run = run_scan(config, raise_fd_limit(concurrency))
+	else:
+		run = run_fuzz(config, min(concurrency, 32))
+	start = time.perf_counter()
+	latencies = asyncio.run(run)
+	elapsed = time.perf_counter() - start
+
+	#ru_maxrss is in KB on Linux and bytes on macOS
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == "darwin":
+		peak //= 1024
+	return {
+		"probes": len(latencies),
+		"seconds": round(elapsed, 4),
+		"probes_per_sec": round(len(latencies) / elapsed, 1),
+		"p50_ms": round(percentile(latencies, .5) * 1000, 3),
+		"p99_ms": round(percentile(latencies, .99) * 1000, 3),
+		"peak_rss_kb": peak,
+	}
+
+
+def load_previous():
+	try:
+		with open(RESULTS) as f:
+			lines = f.read().splitlines()
+	except OSError:
+		return None
+	return json.loads(lines[-1]) if lines else None
+
+
+def compare(name, result, previous, threshold):
+	if not previous or name not in previous["scenarios"]:
+		return ""
+	old = previous["scenarios"][name]["probes_per_sec"]
+	change = (result["probes_per_sec"] - old) / old
+	note = "%+.1f%%" % (change * 100)
+	if change < -threshold:
+		note += " REGRESSION"
+	return note
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		usage="python benchmark.py [options] [scenario ...]",
+		epilog="scenarios: " + ", ".join(SCENARIOS))
+	parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS))
+	parser.add_argument("-c", "--concurrency", type=int, default=200,
+		help="scan concurrency (fuzz scenarios use at most 32) (default: 200)")
+	parser.add_argument("--threshold", type=float, default=.1,
+		help="slowdown versus the previous run flagged as a regression (default: .1)")
+	parser.add_argument("--no-save", action="store_true",
+		help="do not append this run to bench-results.jsonl")
+	parser.add_argument("--worker", help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.worker:
+		print(json.dumps(run_scenario(args.worker, args.concurrency)))
+		exit()
+
+	for name in args.scenarios:
+		if name not in SCENARIOS:
+			parser.error("unknown scenario: %s" % name)
+
+	previous = load_previous()
+	raise_fd_limit(len(OPEN) + 2 * len(FILTERED) + len(SLOW))
+	sim = start_sim()
+	run = {
+		"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python": sys.version.split()[0],
+		"concurrency": args.concurrency,
+		"scenarios": {},
+	}
+	try:
+		print("%-10s %8s %10s %10s %10s %12s" % ("scenario", "probes", "probes/s", "p50 ms", "p99 ms", "peak RSS KB"))
+		for name in args.scenarios:
+			output = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+				"--worker", name, "-c", str(args.concurrency)])
+			result = json.loads(output)
+			run["scenarios"][name] = result
+			print("%-10s %8i %10.1f %10.3f %10.3f %12i  %s" % (name, result["probes"],
+				result["probes_per_sec"], result["p50_ms"], result["p99_ms"],
+				result["peak_rss_kb"], compare(name, result, previous, args.threshold)))
+	finally:
+		sim.terminate()
+		sim.wait()
+
+	if not args.no_save:
+		with open(RESULTS, "a") as f:
+			f.write(json.dumps(run) + "\n")
@@ -0,0 +1,142 @@
+#Append-only test case corpus for fuzzer.py --corpus
+#
+#Every case sent is appended to one file together with its outcome, so an
+#overnight run can be replayed and triaged afterwards. The file is:
+#
+#	MAGIC, then one record per case:
+#	<length u32> <time f64> <outcome u8> <digest 8 bytes> <case bytes>
+#
+#Records are only ever appended. A record cut short by a crash of the
+#fuzzer itself is ignored when reading and cut off when the corpus is
+#next opened for appending. Reading goes through mmap, so walking the
+#headers of a multi-GB corpus never loads the cases into memory, and a
+#case is only copied out when it is asked for.
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import time
+
+MAGIC = b"R7CORP1\n"
+HEADER = struct.Struct("<IdB8s")
+
+#"suspect" is a case that looked like a crash while other cases were in
+#flight; "crash" is only written once a case crashed the target on its own
+OUTCOMES = ["ok", "crash", "timeout", "refused", "suspect"]
+CODES = dict((name, code) for code, name in enumerate(OUTCOMES))
+
+
+def digest(data):
+	#8 byte digest of a case, also what mutations.Deduplicator skips by
+	return hashlib.blake2b(data, digest_size=8).digest()
+
+
+class Corpus:
+
+	def __init__(self, path, append=True):
+		#Without append the corpus is only read: the file must exist and is
+		#left exactly as it is, so a run can be looked at while a fuzzer is
+		#still writing to it
+		self.path = path
+		self.file = None
+		new = append and (not os.path.exists(path) or os.path.getsize(path) == 0)
+		if not new:
+			with open(path, "rb") as f:
+				if f.read(len(MAGIC)) != MAGIC:
+					raise ValueError("%s is not a corpus file" % path)
+		if not append:
+			return
+		if not new:
+			#A record cut short by a crash of the fuzzer would hide every
+			#record appended after it, so drop it before appending
+			end = len(MAGIC)
+			for index, offset, length, when, outcome, key in self.records():
+				end = offset + length
+			if os.path.getsize(path) > end:
+				os.truncate(path, end)
+		self.file = open(path, "ab")
+		if new:
+			self.file.write(MAGIC)
+			self.file.flush()
+
+	def append(self, data, outcome):
+		self.file.write(HEADER.pack(len(data), time.time(), CODES[outcome], digest(data)) + data)
+		#Flushed every time, so a record is on disk before the next case
+		#can take the target (or this machine) down
+		self.file.flush()
+
+	def close(self):
+		if self.file is not None:
+			self.file.close()
+
+	def records(self):
+		#Yield (index, offset, length, time, outcome, digest) for every
+		#complete record, reading only the headers
+		with open(self.path, "rb") as f:
+			size = os.fstat(f.fileno()).st_size
+			if size <= len(MAGIC):
+				return
+			with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+				offset = len(MAGIC)
+				index = 0
+				while offset + HEADER.size <= size:
+					length, when, code, key = HEADER.unpack_from(mm, offset)
+					start = offset + HEADER.size
+					if start + length > size:
+						break
+					yield index, start, length, when, OUTCOMES[code], key
+					offset = start + length
+					index += 1
+
+	def read(self, offset, length):
+		with open(self.path, "rb") as f:
+			with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+				return mm[offset:offset + length]
+
+	def case(self, index):
+		#The bytes of case number `index`
+		for i, offset, length, when, outcome, key in self.records():
+			if i == index:
+				return self.read(offset, length)
+		raise IndexError("no case %i in %s" % (index, self.path))
+
+	def digests(self):
+		#Digests of the cases already sent that got a definite answer, to
+		#skip them on a later run. Timeouts, refusals and suspects may have
+		#been the target's fault rather than the case's, so they are sent
+		#again.
+		return set(record[5] for record in self.records() if record[4] in ("ok", "crash"))
+
+	def crashes(self):
+		#(index, offset, length, digest) of the first record of every
+		#distinct crashing input
+		seen = set()
+		for index, offset, length, when, outcome, key in self.records():
+			if outcome == "crash" and key not in seen:
+				seen.add(key)
+				yield index, offset, length, key
+
+
+if __name__ == "__main__":
+	try:
+		path = sys.argv[1]
+	except IndexError:
+		print("  USAGE: python corpus.py <CORPUS>")
+		print("EXAMPLE: python fuzzer.py --mutate --keep-going --corpus run.corpus 192.168.1.1 9999")
+		print("         python corpus.py run.corpus")
+		print("         python fuzzer.py --corpus run.corpus --replay 1234 192.168.1.1 9999")
+		exit()
+	if not os.path.exists(path):
+		print("%s does not exist" % path)
+		exit(1)
+
+	corpus = Corpus(path, append=False)
+	counts = dict((name, 0) for name in OUTCOMES)
+	for record in corpus.records():
+		counts[record[4]] += 1
+	print("%i cases: %s" % (sum(counts.values()), ", ".join("%i %s" % (counts[name], name) for name in OUTCOMES)))
+	for index, offset, length, key in corpus.crashes():
+		print("crash\tcase %i\t%i bytes\t%r" % (index, length, corpus.read(offset, min(length, 40))))
+	corpus.close()
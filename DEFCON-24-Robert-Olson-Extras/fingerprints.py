@@ -0,0 +1,132 @@
+#Banner fingerprinting against signatures.txt
+#
+#Instead of grepping every banner once per signature, all signatures are
+#compiled once into a single alternation, one named group per signature:
+#
+#	(?P<s0>...)|(?P<s1>...)|(?P<s2>...)...
+#
+#so classifying a banner is a single search over it. The name of the group
+#that matched tells us which signature it was, and the signature's own
+#first capture group (if any) is its version.
+#
+#Can also be run on its own to classify the banners in a JSONL scan file:
+#	python fingerprints.py results.jsonl
+
+import json
+import os
+import re
+import sys
+
+DEFAULT_SIGNATURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "signatures.txt")
+
+#\1 to \9 outside an escaped backslash. Once a signature is wrapped in its
+#named group its own groups are renumbered, so a numbered backreference
+#would point at the wrong group.
+BACKREFERENCE = re.compile(rb"(?<!\\)(?:\\\\)*\\[1-9]")
+
+
+def check_signature(pattern):
+	#Raise ValueError if pattern cannot be one branch of the combined
+	#alternation: not a valid regex, a numbered backreference, or a global
+	#flag such as (?i), which is only allowed at the start of the whole
+	#expression
+	if BACKREFERENCE.search(pattern):
+		raise ValueError("numbered backreferences are not supported, use (?P<name>...) and (?P=name)")
+	try:
+		re.compile(b"(?P<s0>%s)" % pattern)
+	except re.error as e:
+		raise ValueError(str(e))
+
+
+def combine(patterns):
+	#One regex with a named group s<i> around every pattern
+	try:
+		return re.compile(b"|".join(b"(?P<s%i>%s)" % (i, pattern) for i, pattern in enumerate(patterns)))
+	except re.error as e:
+		raise ValueError("signatures cannot be combined: %s" % e)
+
+
+def load_signatures(path=DEFAULT_SIGNATURES):
+	#Returns a list of (service, pattern bytes) in file order
+	signatures = []
+	with open(path, encoding="latin-1") as f:
+		for number, line in enumerate(f, 1):
+			line = line.rstrip("\r\n")
+			if not line.strip() or line.lstrip().startswith("#"):
+				continue
+			try:
+				service, pattern = line.split(None, 1)
+			except ValueError:
+				raise ValueError("%s:%i: expected <service> <regex>" % (path, number))
+			pattern = pattern.strip().encode("latin-1")
+			try:
+				check_signature(pattern)
+			except ValueError as e:
+				raise ValueError("%s:%i: %s" % (path, number, e))
+			signatures.append((service, pattern))
+	try:
+		combine([pattern for service, pattern in signatures])
+	except ValueError as e:
+		raise ValueError("%s: %s" % (path, e))
+	return signatures
+
+
+class FingerprintIndex:
+
+	def __init__(self, signatures):
+		self.services = []
+		self.version_groups = []
+		for service, pattern in signatures:
+			check_signature(pattern)
+			self.services.append(service)
+		self.regex = combine([pattern for service, pattern in signatures])
+
+		#Group number of each signature's first inner capture group, or
+		#None if the signature has none
+		for i, (service, pattern) in enumerate(signatures):
+			outer = self.regex.groupindex["s%i" % i]
+			if re.compile(pattern).groups:
+				self.version_groups.append(outer + 1)
+			else:
+				self.version_groups.append(None)
+
+	@classmethod
+	def load(cls, path=DEFAULT_SIGNATURES):
+		return cls(load_signatures(path))
+
+	def match(self, banner):
+		#Returns (service, version) for the banner, or (None, None)
+		if not banner:
+			return None, None
+		m = self.regex.search(banner)
+		if m is None:
+			return None, None
+		#The outer named group closes after any groups nested inside it,
+		#so lastgroup is always the signature's own group
+		i = int(m.lastgroup[1:])
+		version = None
+		if self.version_groups[i] is not None:
+			version = m.group(self.version_groups[i])
+			if version is not None:
+				version = version.decode("latin-1")
+		return self.services[i], version
+
+
+if __name__ == "__main__":
+	try:
+		path = sys.argv[1]
+	except IndexError:
+		print("  USAGE: python fingerprints.py <SCAN_RESULTS.jsonl> [SIGNATURES]")
+		print("EXAMPLE: python port-scanner.py -b -f jsonl -o scan.jsonl 192.168.1.1")
+		print("         python fingerprints.py scan.jsonl")
+		exit()
+
+	index = FingerprintIndex.load(*sys.argv[2:3])
+	with open(path) as f:
+		for line in f:
+			result = json.loads(line)
+			banner = result.get("banner")
+			if not banner:
+				continue
+			service, version = index.match(banner.encode("latin-1"))
+			print("%s:%i\t%s\t%s" % (result["host"], result["port"], service or "unknown", version or ""))
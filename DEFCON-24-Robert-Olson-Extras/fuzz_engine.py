@@ -0,0 +1,452 @@
+#Fuzzing engine used by fuzzer.py
+#
+#Every test case is one connection: read the banner, send the case, read
+#the reply. The outcome of a case is one of:
+#
+#	ok      - the target answered (or dropped us but is still up)
+#	crash   - the target dropped the connection after our case and no
+#	          longer accepts new connections
+#	timeout - we could not connect before the timeout
+#	refused - the connection was refused (or dropped before we sent anything)
+#
+#timeout and refused say nothing about the case itself: the target was
+#already down or unreachable, so those cases must be run again.
+#
+#Finding a crashing length happens in two phases:
+#
+#	1. a coarse sweep from lbound to ubound in steps of inc, several
+#	   lengths in parallel, until a batch crashes the target
+#	2. a bisection between the longest length known not to crash and the
+#	   shortest length known to crash, one probe at a time, which finds
+#	   the smallest crashing length in O(log n) probes instead of walking
+#	   every length (and possibly restarting the target) in between
+
+import asyncio
+import itertools
+import shlex
+import socket
+import time
+
+from scan_engine import run_pool
+
+OK = "ok"
+CRASH = "crash"
+TIMEOUT = "timeout"
+REFUSED = "refused"
+#A crash seen while other cases were in flight, not yet replayed on its own
+SUSPECT = "suspect"
+
+#How often to poll a target we restarted ourselves
+RESTART_INTERVAL = .2
+
+
+def trun_case(length):
+	#The original fuzzer's test case: TRUN . followed by `length` A's
+	return b"TRUN ." + b"A" * length + b"\r\n"
+
+
+async def recv(conn, timeout, size=4096):
+	loop = asyncio.get_running_loop()
+	return await asyncio.wait_for(loop.sock_recv(conn, size), timeout)
+
+
+async def open_conn(host, port, timeout):
+	#Connect and read the banner. Returns (outcome, socket); the socket is
+	#only returned when the target greeted us normally.
+	loop = asyncio.get_running_loop()
+	conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	conn.setblocking(False)
+	try:
+		await asyncio.wait_for(loop.sock_connect(conn, (host, port)), timeout)
+	except asyncio.TimeoutError:
+		conn.close()
+		return TIMEOUT, None
+	except OSError:
+		conn.close()
+		return REFUSED, None
+	try:
+		banner = await recv(conn, timeout)
+	except (asyncio.TimeoutError, OSError):
+		banner = b""
+	if not banner:
+		conn.close()
+		return REFUSED, None
+	return OK, conn
+
+
+async def is_alive(host, port, timeout):
+	#Liveness probe: the target is up if it accepts a connection and
+	#sends its banner
+	outcome, conn = await open_conn(host, port, timeout)
+	if conn is not None:
+		conn.close()
+	return outcome == OK
+
+
+async def wait_alive(host, port, timeout, patience=None, interval=1.0):
+	#Poll the target until it answers again (e.g. after it was restarted
+	#in the debugger). Gives up after `patience` seconds if given.
+	start = time.monotonic()
+	while not await is_alive(host, port, timeout):
+		if patience is not None and time.monotonic() - start >= patience:
+			return False
+		await asyncio.sleep(interval)
+	return True
+
+
+async def ensure_alive(host, port, timeout, patience=None, log=print, restarter=None):
+	#Make sure the target is accepting connections before the next probe.
+	#If it is down, restart it through the restarter hook (RestartCommand,
+	#TargetProcess) or wait for it to be restarted by hand.
+	if not await is_alive(host, port, timeout):
+		if restarter is None:
+			log("Target is down, waiting for it to be restarted...")
+			interval = 1.0
+		else:
+			log("Target is down, restarting it...")
+			await restarter.restart()
+			interval = RESTART_INTERVAL
+		if not await wait_alive(host, port, timeout, patience, interval):
+			raise ConnectionError("target %s:%i did not come back" % (host, port))
+
+
+async def send_case(host, port, payload, timeout, stats=None):
+	#Run one test case. With an instrument.Stats, the time spent in each
+	#stage (connect and banner, reply, liveness check) is recorded too.
+	loop = asyncio.get_running_loop()
+	start = time.monotonic()
+	outcome, conn = await open_conn(host, port, timeout)
+	if stats is not None:
+		stats.observe("connect", time.monotonic() - start)
+		if outcome == TIMEOUT:
+			stats.count("timeouts")
+	if conn is None:
+		return outcome
+
+	start = time.monotonic()
+	try:
+		await asyncio.wait_for(loop.sock_sendall(conn, payload), timeout)
+		reply = await recv(conn, timeout)
+	except asyncio.TimeoutError:
+		#No reply: the target may be hung or dead, or just slow
+		reply = None
+	except OSError:
+		#Reset by the target
+		reply = b""
+	finally:
+		conn.close()
+	if stats is not None:
+		stats.observe("reply", time.monotonic() - start)
+		stats.count("bytes sent", len(payload))
+		if reply is None:
+			stats.count("timeouts")
+		else:
+			stats.count("bytes received", len(reply))
+
+	if reply:
+		return OK
+
+	#The connection died (or hung) after our case. It only counts as a
+	#crash if the target has stopped accepting connections, a target that
+	#just closes connections on bad input is still up.
+	start = time.monotonic()
+	alive = await is_alive(host, port, timeout)
+	if stats is not None:
+		stats.observe("liveness", time.monotonic() - start)
+	if alive:
+		return OK
+	return CRASH
+
+
+async def send_limited(limiter, host, port, payload, timeout, stats=None):
+	#send_case paced by an optional ratelimit.RateLimiter. The outcome is
+	#not reported to the limiter here: whether a refused connect means we
+	#are too fast depends on whether the target crashed, see Fuzzer.send.
+	if limiter is not None:
+		await limiter.acquire()
+	if stats is not None:
+		stats.start()
+		start = time.monotonic()
+	outcome = await send_case(host, port, payload, timeout, stats)
+	if stats is not None:
+		stats.finish("case", time.monotonic() - start)
+		stats.count(outcome)
+	return outcome
+
+
+class RestartCommand:
+
+	#Restart hook for a target on another machine: after a crash, run a
+	#command to completion (e.g. a script that restarts VulnServer in the
+	#debugger on the Windows VM) and let ensure_alive wait for the target
+
+	def __init__(self, command, log=print):
+		self.command = command
+		self.log = log
+
+	async def start(self):
+		pass
+
+	async def restart(self):
+		process = await asyncio.create_subprocess_shell(self.command)
+		status = await process.wait()
+		if status != 0:
+			self.log("Restart command exited with status %i" % status)
+
+	async def stop(self):
+		pass
+
+
+class TargetProcess:
+
+	#Restart hook for a target we run ourselves (e.g. vulnserver_sim.py):
+	#it is launched when fuzzing starts, and killed and launched again
+	#after every crash, so a crash that leaves it hung is recovered too
+
+	def __init__(self, command, log=print):
+		self.argv = shlex.split(command)
+		self.log = log
+		self.process = None
+
+	async def start(self):
+		self.process = await asyncio.create_subprocess_exec(*self.argv)
+
+	async def restart(self):
+		if self.process is not None and self.process.returncode is not None:
+			self.log("Target exited with status %i" % self.process.returncode)
+		await self.stop()
+		await self.start()
+
+	async def stop(self):
+		if self.process is not None and self.process.returncode is None:
+			self.process.kill()
+			await self.process.wait()
+		self.process = None
+
+
+class Fuzzer:
+
+	#What both fuzzers share: the target, the pacing, the corpus every case
+	#is logged to and the hook that brings the target back after a crash
+
+	def __init__(self, host, port, concurrency=8, timeout=5.0, patience=None, log=print,
+			limiter=None, corpus=None, restarter=None, stats=None):
+		self.host = host
+		self.port = port
+		self.concurrency = concurrency
+		self.timeout = timeout
+		self.patience = patience
+		self.log = log
+		self.limiter = limiter
+		self.corpus = corpus
+		self.restarter = restarter
+		self.stats = stats
+		self.probes = 0
+		#Refused and timed out cases since the last restart, and whether a
+		#case crashed the target since then (see feedback)
+		self.failures = 0
+		self.down = False
+
+	async def send(self, data, alone=True):
+		#Run one case and log it. A crash seen while other cases were in
+		#flight is only a suspect until it has been replayed on its own.
+		self.probes += 1
+		outcome = await send_limited(self.limiter, self.host, self.port, data, self.timeout, self.stats)
+		if self.corpus is not None:
+			self.corpus.append(data, SUSPECT if outcome == CRASH and not alone else outcome)
+		self.feedback(outcome)
+		return outcome
+
+	def feedback(self, outcome):
+		#Tell the limiter how a case went. When one case crashes the target,
+		#the others in flight come back refused (often before the crash is
+		#confirmed), and that is the crash, not the rate. So failures are
+		#held until the next restart and only reported then if nothing
+		#crashed; after a crash nothing is reported until the target is back.
+		if self.limiter is None or self.down:
+			return
+		if outcome == CRASH:
+			self.down = True
+			self.failures = 0
+		elif outcome == OK:
+			self.limiter.record(True)
+		else:
+			self.failures += 1
+
+	async def start(self):
+		#Launch the target if it is ours to run, and wait until it listens
+		if self.restarter is None:
+			return
+		await self.restarter.start()
+		if not await wait_alive(self.host, self.port, self.timeout, self.patience, RESTART_INTERVAL):
+			raise ConnectionError("target %s:%i did not start" % (self.host, self.port))
+
+	async def stop(self):
+		if self.restarter is not None:
+			await self.restarter.stop()
+
+	async def restart(self):
+		start = time.monotonic()
+		await ensure_alive(self.host, self.port, self.timeout, self.patience, self.log, self.restarter)
+		if self.stats is not None:
+			self.stats.observe("restart", time.monotonic() - start)
+		if self.limiter is not None:
+			for _ in range(self.failures):
+				self.limiter.record(False)
+		self.failures = 0
+		self.down = False
+
+
+class LengthFuzzer(Fuzzer):
+
+	def __init__(self, host, port, concurrency=8, timeout=5.0, make_case=trun_case,
+			patience=None, log=print, limiter=None, corpus=None, restarter=None, stats=None):
+		Fuzzer.__init__(self, host, port, concurrency, timeout, patience, log, limiter, corpus, restarter, stats)
+		self.make_case = make_case
+		#How far the search got: the longest length known not to crash and
+		#the shortest one known to crash (None until there is one)
+		self.lo = None
+		self.hi = None
+
+	async def probe(self, length):
+		#Run one length, waiting for the target to come back and repeating
+		#the case for as long as it cannot be reached
+		while True:
+			outcome = await self.send(self.make_case(length))
+			if outcome in (OK, CRASH):
+				return outcome
+			self.log("Target unreachable (%s) at length %i, waiting for it to come back..." % (outcome, length))
+			await self.restart()
+
+	async def sweep(self, lbound, ubound, inc):
+		#Phase 1: run the lengths in batches of self.concurrency. Returns
+		#(longest ok length, crashing lengths of the first crashing batch).
+		lengths = list(range(lbound, ubound, inc))
+		known_ok = None
+		for start in range(0, len(lengths), self.concurrency):
+			batch = lengths[start:start + self.concurrency]
+			self.log("Sweeping lengths %i-%i" % (batch[0], batch[-1]))
+			outcomes = await asyncio.gather(*(
+				self.send(self.make_case(length), alone=len(batch) == 1)
+				for length in batch))
+
+			crashes = [length for length, outcome in zip(batch, outcomes) if outcome == CRASH]
+			if crashes:
+				#In a parallel batch the first crash can take the other
+				#cases down with it, so only lengths below every crash are
+				#known to be fine
+				for length, outcome in zip(batch, outcomes):
+					if outcome == OK and length < crashes[0]:
+						known_ok = length
+				return known_ok, crashes
+
+			unreachable = [length for length, outcome in zip(batch, outcomes) if outcome not in (OK, CRASH)]
+			for length in unreachable:
+				if await self.probe(length) == CRASH:
+					return known_ok, [length]
+			known_ok = self.lo = batch[-1]
+		return known_ok, []
+
+	async def find_crash(self, lbound, ubound, inc, bisect=True):
+		#Returns the smallest crashing length found, or None
+		known_ok, crashes = await self.sweep(lbound, ubound, inc)
+		if not crashes:
+			return None
+		if not bisect:
+			return crashes[0]
+
+		#A crash seen during the parallel sweep may have been caused by
+		#another case in the same batch, so confirm it on its own first
+		self.lo = known_ok if known_ok is not None else lbound - 1
+		for length in crashes:
+			await self.restart()
+			if await self.probe(length) == CRASH:
+				self.hi = length
+				break
+			self.lo = length
+		if self.hi is None:
+			return None
+
+		#Phase 2: bisection. lo never crashes, hi always does.
+		while self.hi - self.lo > 1:
+			mid = (self.lo + self.hi) // 2
+			await self.restart()
+			if await self.probe(mid) == CRASH:
+				self.hi = mid
+			else:
+				self.lo = mid
+			self.log("Bisecting: %i does not crash, %i does" % (self.lo, self.hi))
+		return self.hi
+
+
+class MutationFuzzer(Fuzzer):
+
+	#Runs a (lazy) stream of mutations.Case through a bounded pool of
+	#connections until one of them crashes the target, or with keep_going
+	#through the whole stream, restarting the target after every crash.
+	#Crashes are bucketed by command and payload kind: the first case of a
+	#bucket is reported, later ones are only counted.
+
+	def __init__(self, host, port, concurrency=8, timeout=5.0, patience=None, log=print,
+			limiter=None, corpus=None, restarter=None, keep_going=False, stats=None):
+		Fuzzer.__init__(self, host, port, concurrency, timeout, patience, log, limiter, corpus, restarter, stats)
+		self.keep_going = keep_going
+		#(command, kind) -> [first crashing case, number of crashing cases]
+		self.crashes = {}
+
+	def crashed(self, case):
+		bucket = self.crashes.get((case.command, case.kind))
+		if bucket is not None:
+			bucket[1] += 1
+			self.log("%s %s (%i bytes) crashed the target again" % (case.command, case.kind, case.size))
+			return
+		self.crashes[(case.command, case.kind)] = [case, 1]
+		self.log("CRASH: %s %s (%i bytes)" % (case.command, case.kind, case.size))
+
+	async def run(self, cases):
+		#Returns [(first case, count)] for every crash bucket found, which
+		#without keep_going is at most the first confirmed crash
+		cases = iter(cases)
+		while True:
+			suspects = []
+			retry = []
+
+			async def worker(case):
+				outcome = await self.send(case.data, alone=self.concurrency == 1)
+				if outcome == CRASH:
+					suspects.append(case)
+				elif outcome in (TIMEOUT, REFUSED):
+					retry.append(case)
+
+			#Stop handing out new cases as soon as the target has gone down
+			def jobs():
+				for case in cases:
+					yield case
+					if suspects:
+						return
+
+			await run_pool(jobs(), worker, self.concurrency)
+			if not suspects and not retry:
+				break
+
+			#Other cases in flight when the target died look like crashes
+			#too, so replay every suspect on its own
+			for case in suspects:
+				await self.restart()
+				if self.concurrency == 1:
+					#Nothing else was in flight, the crash is already confirmed
+					outcome = CRASH
+				else:
+					outcome = await self.send(case.data)
+				if outcome == CRASH:
+					self.crashed(case)
+					if not self.keep_going:
+						return self.results()
+				else:
+					self.log("%s %s (%i bytes) did not crash on its own" % (case.command, case.kind, case.size))
+			await self.restart()
+			cases = itertools.chain(retry, cases)
+		return self.results()
+
+	def results(self):
+		return [(case, count) for case, count in self.crashes.values()]
@@ -1,29 +1,198 @@
-import socket
-import sys
+import argparse
+import asyncio
 
-try:
-	ip = sys.argv[1]
-	port = int(sys.argv[2])
-	lbound = int(sys.argv[3])
-	ubound	 = int(sys.argv[4])
-	inc = int(sys.argv[5])
-except:
-	print "  USAGE: python fuzzer.py <IP> <PORT> <LOWER BOUND> <UPPER BOUND> <INCREMENT>"
-	print "EXAMPLE: tpython fuzzer.py 192.168.1.1 1234 500 2000 5"
-	print "\t This will try string lengths between 500 and 2000 in increments of 5"
+from corpus import Corpus
+from fuzz_engine import LengthFuzzer, MutationFuzzer, RestartCommand, TargetProcess
+from instrument import Stats, monitor, profiled
+from mutations import COMMANDS, GENERATORS, Deduplicator, generate
+from ratelimit import RateLimiter
+
+parser = argparse.ArgumentParser(
+	usage="python fuzzer.py [options] <IP> <PORT> <LOWER BOUND> <UPPER BOUND> <INCREMENT>\n"
+		"       python fuzzer.py [options] --mutate <IP> <PORT>",
+	epilog="EXAMPLE: python fuzzer.py 192.168.1.1 9999 500 5000 100\n"
+		"\t This will try string lengths between 500 and 5000 in increments of 100,\n"
+		"\t then narrow the crash down to the exact length\n"
+		"EXAMPLE: python fuzzer.py --mutate --commands GMON,KSTET 192.168.1.1 9999\n"
+		"\t This will run boundary, format string, cyclic and special payloads\n"
+		"\t through the GMON and KSTET commands\n"
+		"EXAMPLE: python fuzzer.py --mutate --keep-going --corpus run.corpus \\\n"
+		"\t     --target-cmd \"python vulnserver_sim.py --crash-mode exit\" 127.0.0.1 9999\n"
+		"\t This will run every case, relaunching the target after each crash and\n"
+		"\t logging every case to run.corpus (list its crashes with corpus.py)",
+	formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("ip")
+parser.add_argument("port", type=int)
+parser.add_argument("lbound", type=int, nargs="?")
+parser.add_argument("ubound", type=int, nargs="?")
+parser.add_argument("inc", type=int, nargs="?")
+parser.add_argument("-m", "--mutate", action="store_true",
+	help="fuzz with the mutation engine instead of TRUN length sweeps")
+parser.add_argument("--commands", default=",".join(COMMANDS),
+	help="VulnServer commands to mutate (default: all of them)")
+parser.add_argument("--generators", default=",".join(GENERATORS),
+	help="payload generators to use (default: %s)" % ",".join(GENERATORS))
+parser.add_argument("-c", "--concurrency", type=int, default=8,
+	help="test cases to run in parallel (default: 8)")
+parser.add_argument("-t", "--timeout", type=float, default=5.0,
+	help="seconds to wait for the connect and for each reply (default: 5)")
+parser.add_argument("--no-bisect", action="store_true",
+	help="stop after the sweep instead of searching for the smallest crashing length")
+parser.add_argument("--patience", type=float,
+	help="give up if the target does not come back within this many seconds")
+parser.add_argument("--rate", type=float,
+	help="start at this many test cases per second and adapt to what the target sustains (default: unlimited)")
+parser.add_argument("--min-rate", type=float, default=1.0,
+	help="never slow down below this many test cases per second (default: 1)")
+parser.add_argument("--max-rate", type=float,
+	help="never speed up beyond this many test cases per second (default: no cap)")
+parser.add_argument("--corpus", metavar="FILE",
+	help="log every case and its outcome to FILE; with --mutate, cases already in FILE are skipped")
+parser.add_argument("--keep-going", action="store_true",
+	help="with --mutate, keep fuzzing after a crash and report every distinct crash at the end")
+parser.add_argument("--target-cmd", metavar="CMD",
+	help="run the target ourselves with CMD, and kill and relaunch it after every crash")
+parser.add_argument("--restart-cmd", metavar="CMD",
+	help="run CMD to bring the target back after a crash, instead of waiting for you")
+parser.add_argument("--replay", type=int, metavar="N",
+	help="send case N of the --corpus to the target once and report the outcome")
+parser.add_argument("--stats", type=float, nargs="?", const=1.0, metavar="SECONDS",
+	help="print cases in flight, outcomes, bytes and per-stage latencies to stderr every SECONDS (default: 1)")
+parser.add_argument("--profile", metavar="FILE",
+	help="run under cProfile and save the profile to FILE (read it with python -m pstats FILE)")
+args = parser.parse_args()
+
+if args.target_cmd and args.restart_cmd:
+	parser.error("--target-cmd and --restart-cmd cannot be used together")
+if args.replay is not None and not args.corpus:
+	parser.error("--replay needs --corpus")
+
+#With --rate, test cases are paced by a token bucket that speeds up while
+#the target keeps answering and halves its rate when connections start
+#being refused or timing out. Connections refused because a case crashed
+#the target do not count, so expected crashes do not slow the run down.
+limiter = None
+if args.rate:
+	limiter = RateLimiter(args.rate, args.min_rate, args.max_rate)
+
+#A crashed target comes back through one of the restart hooks, or by hand
+restarter = None
+if args.target_cmd:
+	restarter = TargetProcess(args.target_cmd)
+elif args.restart_cmd:
+	restarter = RestartCommand(args.restart_cmd)
+
+corpus = None
+if args.corpus:
+	try:
+		#A replay only reads the corpus
+		corpus = Corpus(args.corpus, append=args.replay is None)
+	except (OSError, ValueError) as e:
+		parser.error(str(e))
+
+
+#With --stats, every case is counted and the time spent connecting,
+#waiting for replies, checking liveness and restarting is measured
+stats = Stats() if args.stats is not None else None
+
+
+async def run(fuzzer, job, *job_args):
+	#Launch the target if it is ours, run the job and kill the target again
+	await fuzzer.start()
+	try:
+		if stats is not None:
+			return await monitor(stats, job(*job_args), args.stats)
+		return await job(*job_args)
+	finally:
+		await fuzzer.stop()
+
+
+if args.replay is not None:
+	try:
+		data = corpus.case(args.replay)
+	except IndexError as e:
+		parser.error(str(e))
+	#The replay itself is not logged, the corpus stays a record of the run
+	fuzzer = MutationFuzzer(args.ip, args.port, 1, args.timeout, args.patience, restarter=restarter,
+		stats=stats)
+	try:
+		outcome = profiled(args.profile, asyncio.run, run(fuzzer, fuzzer.send, data))
+	except ConnectionError as e:
+		print("Giving up: %s" % e)
+		exit(1)
+	print("Case %i (%i bytes): %s" % (args.replay, len(data), outcome))
 	exit()
 
+if args.mutate:
+	try:
+		cases = generate(args.commands.split(","), args.generators.split(","))
+	except ValueError as e:
+		parser.error(str(e))
+
+	#Cases are built lazily from the command grammar and each distinct case
+	#is only ever sent once, including by an earlier run logged to --corpus
+	dedupe = Deduplicator(corpus.digests() if corpus is not None else None)
+	fuzzer = MutationFuzzer(args.ip, args.port, args.concurrency, args.timeout, args.patience,
+		limiter=limiter, corpus=corpus, restarter=restarter, keep_going=args.keep_going,
+		stats=stats)
+	try:
+		crashes = profiled(args.profile, asyncio.run, run(fuzzer, fuzzer.run, dedupe.unique(cases)))
+	except (ConnectionError, KeyboardInterrupt) as e:
+		#A partial --keep-going run still has its crashes
+		crashes = fuzzer.results()
+		if isinstance(e, ConnectionError):
+			print("Giving up: %s" % e)
+		if not crashes:
+			exit(1)
+
+	if not crashes:
+		print("No crash found (%i probes)" % fuzzer.probes)
+	for case, count in crashes:
+		print("******************************")
+		print("CRASH DETECTED - %s, %s payload, %i bytes" % (case.command, case.kind, case.size))
+		print("******************************")
+		print("%r" % case.data[:80])
+		if count > 1:
+			print("(%i crashing cases of this kind)" % count)
+	if crashes:
+		print("(%i probes)" % fuzzer.probes)
+	exit()
+
+if args.inc is None:
+	parser.error("LOWER BOUND, UPPER BOUND and INCREMENT are required without --mutate")
+if args.inc < 1 or args.lbound >= args.ubound:
+	parser.error("need LOWER BOUND < UPPER BOUND and INCREMENT >= 1")
+
+#Instead of walking every length over a single connection loop, the sweep
+#tries --concurrency lengths at once. Once a batch crashes the target, a
+#bisection search finds the smallest crashing length, restarting (or
+#waiting for you to restart) the target between probes.
+#
+#A crash is only reported when the target dropped our connection AND stops
+#accepting new ones; connect timeouts and refused connections just mean
+#the target is unreachable, and those cases are run again.
+fuzzer = LengthFuzzer(args.ip, args.port, args.concurrency, args.timeout, patience=args.patience,
+	limiter=limiter, corpus=corpus, restarter=restarter, stats=stats)
 try:
-	for i in range(lbound, ubound, inc):
-		conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-		conn.settimeout(5)
-		conn.connect((ip, port))
-		data=conn.recv(4096)
-		badbuf = "A" * i
-		conn.send("TRUN .%s\r\n" % badbuf)	
-		data=conn.recv(4096)
-		conn.close()
-except:
-	print "******************************"
-	print "CRASH DETECTED - Length: %i" % i
-	print "******************************"
+	length = profiled(args.profile, asyncio.run,
+		run(fuzzer, fuzzer.find_crash, args.lbound, args.ubound, args.inc, not args.no_bisect))
+except ConnectionError as e:
+	print("Giving up: %s" % e)
+	exit(1)
+except KeyboardInterrupt:
+	#Say how far the search got, to start the next run from there
+	if fuzzer.hi is not None:
+		print("Interrupted: %i does not crash, %i does (%i probes)" % (fuzzer.lo, fuzzer.hi, fuzzer.probes))
+	elif fuzzer.lo is not None:
+		print("Interrupted: no crash up to %i (%i probes)" % (fuzzer.lo, fuzzer.probes))
+	else:
+		print("Interrupted before the first batch finished (%i probes)" % fuzzer.probes)
+	exit(1)
+
+if length is None:
+	print("No crash between %i and %i (%i probes)" % (args.lbound, args.ubound, fuzzer.probes))
+else:
+	print("******************************")
+	print("CRASH DETECTED - Length: %i" % length)
+	print("******************************")
+	print("(%i probes)" % fuzzer.probes)
@@ -0,0 +1,179 @@
+#Hot-path counters and profiling for port-scanner.py and fuzzer.py --stats
+#and --profile
+#
+#The engines update a Stats object, if they were given one, at every
+#stage of a probe:
+#
+#	inflight - connects (or SYNs, or test cases) waiting for an answer
+#	counters - probes by outcome, timeouts, bytes sent and received
+#	stages   - latency histograms per stage (connect, banner, reply,
+#	           output, ...)
+#
+#Updating them is an integer add and a bit_length(): latencies go into
+#log2 buckets of microseconds, so a histogram is a short list of ints no
+#matter how many probes it has seen, and a percentile is exact to within
+#a factor of two. monitor() prints one line per interval with the rates
+#and percentiles of that interval, and a summary of the whole run at the
+#end.
+
+import asyncio
+import cProfile
+import sys
+import time
+
+BUCKETS = 40
+
+
+class Histogram:
+
+	def __init__(self):
+		self.buckets = [0] * BUCKETS
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+
+	def add(self, seconds):
+		#Bucket i holds latencies below 2**i microseconds
+		self.buckets[min(int(seconds * 1e6).bit_length(), BUCKETS - 1)] += 1
+		self.count += 1
+		self.total += seconds
+		if seconds > self.max:
+			self.max = seconds
+
+	def merge(self, other):
+		for i, n in enumerate(other.buckets):
+			self.buckets[i] += n
+		self.count += other.count
+		self.total += other.total
+		self.max = max(self.max, other.max)
+
+	def percentile(self, p):
+		#Upper bound, in seconds, of the bucket holding the p-th percentile
+		wanted = p / 100.0 * self.count
+		seen = 0
+		for i, n in enumerate(self.buckets):
+			seen += n
+			if n and seen >= wanted:
+				return min(2 ** i / 1e6, self.max)
+		return self.max
+
+
+def ms(seconds):
+	return "%.3gms" % (seconds * 1000)
+
+
+def size(count):
+	for unit in ("B", "KB", "MB"):
+		if count < 1024:
+			return "%.3g %s" % (count, unit)
+		count /= 1024.0
+	return "%.3g GB" % count
+
+
+class Stats:
+
+	def __init__(self):
+		self.inflight = 0
+		self.peak_inflight = 0
+		self.counters = {}
+		#Histograms of the current interval, merged into totals by line()
+		self.stages = {}
+		self.totals = {}
+		self.started = time.monotonic()
+		self.last_line = self.started
+		self.last_counters = {}
+
+	def start(self):
+		self.inflight += 1
+		if self.inflight > self.peak_inflight:
+			self.peak_inflight = self.inflight
+
+	def finish(self, stage, seconds):
+		self.inflight -= 1
+		self.observe(stage, seconds)
+
+	def observe(self, stage, seconds):
+		histogram = self.stages.get(stage)
+		if histogram is None:
+			histogram = self.stages[stage] = Histogram()
+		histogram.add(seconds)
+
+	def count(self, name, n=1):
+		self.counters[name] = self.counters.get(name, 0) + n
+
+	def rates(self, counters, since, elapsed):
+		parts = []
+		for name in sorted(counters):
+			rate = (counters[name] - since.get(name, 0)) / elapsed if elapsed > 0 else 0.0
+			if name.startswith("bytes"):
+				parts.append("%s %s/s" % (name.split()[-1], size(rate)))
+			else:
+				parts.append("%s %.0f/s" % (name, rate))
+		return parts
+
+	def latencies(self, stages):
+		return ["%s p50 %s p99 %s" % (stage, ms(h.percentile(50)), ms(h.percentile(99)))
+			for stage, h in sorted(stages.items()) if h.count]
+
+	def line(self):
+		#Rates and percentiles since the previous line
+		now = time.monotonic()
+		parts = ["[%6.1fs] inflight %i" % (now - self.started, self.inflight)]
+		parts += self.rates(self.counters, self.last_counters, now - self.last_line)
+		parts += self.latencies(self.stages)
+		for stage, histogram in self.stages.items():
+			total = self.totals.get(stage)
+			if total is None:
+				total = self.totals[stage] = Histogram()
+			total.merge(histogram)
+		self.stages = {}
+		self.last_counters = dict(self.counters)
+		self.last_line = now
+		return "  ".join(parts)
+
+	def summary(self):
+		#Totals for the whole run
+		self.line()
+		elapsed = time.monotonic() - self.started
+		lines = ["%.1fs, peak inflight %i" % (elapsed, self.peak_inflight)]
+		for name in sorted(self.counters):
+			value = self.counters[name]
+			lines.append("\t%-16s %12s  %s/s" % (name, size(value) if name.startswith("bytes") else value,
+				("%.0f" % (value / elapsed)) if elapsed > 0 else "-"))
+		for stage, h in sorted(self.totals.items()):
+			if h.count:
+				lines.append("\t%-16s %12i  mean %s p50 %s p99 %s max %s" % (stage, h.count,
+					ms(h.total / h.count), ms(h.percentile(50)), ms(h.percentile(99)), ms(h.max)))
+		return "\n".join(lines)
+
+
+async def monitor(stats, job, interval=1.0, stream=None):
+	#Await the coroutine job, printing a stats line every interval seconds
+	#and the summary when it is done (or interrupted)
+	stream = stream if stream is not None else sys.stderr
+
+	async def tick():
+		while True:
+			await asyncio.sleep(interval)
+			print(stats.line(), file=stream)
+
+	ticker = asyncio.ensure_future(tick())
+	try:
+		return await job
+	finally:
+		ticker.cancel()
+		print(stats.summary(), file=stream)
+
+
+def profiled(path, function, *args):
+	#Call function(*args) under cProfile and write the profile to path
+	#(read it with: python -m pstats path). Without a path, just call it.
+	if path is None:
+		return function(*args)
+	profiler = cProfile.Profile()
+	profiler.enable()
+	try:
+		return function(*args)
+	finally:
+		profiler.disable()
+		profiler.dump_stats(path)
@@ -0,0 +1,145 @@
+#Mutation engine for fuzzer.py
+#
+#Test cases are built from a small grammar of VulnServer commands:
+#
+#	<COMMAND> <prefix><payload>\r\n
+#
+#where some commands only reach their vulnerable code path with a given
+#prefix (TRUN wants a ".", GMON a "/"), and the payload comes from a set
+#of generators: boundary lengths, format strings, cyclic patterns and odd
+#characters. Cases are generated lazily, commands are interleaved so every
+#command gets coverage early, and cases already sent are skipped.
+
+import itertools
+from collections import namedtuple
+
+from corpus import digest
+from pattern import cyclic
+
+Case = namedtuple("Case", "command kind size data")
+
+#Command -> prefixes to put in front of the payload
+COMMANDS = {
+	"TRUN": [b".", b""],
+	"GMON": [b"/", b""],
+	"KSTET": [b""],
+	"GTER": [b""],
+	"HTER": [b""],
+	"LTER": [b"."],
+	"GDOG": [b""],
+	"KSTAN": [b""],
+	"SRUN": [b""],
+	"STATS": [b""],
+	"RTIME": [b""],
+	"LTIME": [b""],
+}
+
+#Lengths around buffer sizes that tend to matter: powers of two and their
+#neighbours, plus a few round numbers
+BOUNDARY_LENGTHS = sorted(set(
+	[n + d for n in (2 ** k for k in range(4, 15)) for d in (-1, 0, 1)]
+	+ [80, 100, 500, 1000, 2000, 3000, 5000, 10000]))
+
+FORMAT_STRINGS = [b"%s", b"%x", b"%n", b"%p", b"%08x."]
+FORMAT_REPEATS = [1, 4, 16, 64, 256]
+
+SPECIAL = [
+	b"",
+	b"\x00",
+	b"\x00" * 64,
+	b"\xff" * 64,
+	b"\r\n" * 32,
+	b"../" * 64,
+	b"'" * 64,
+	b"-1",
+	b"4294967296",
+	bytes(range(256)),
+]
+
+
+def boundary_payloads():
+	for length in BOUNDARY_LENGTHS:
+		yield "boundary", b"A" * length
+
+
+def format_payloads():
+	for fmt in FORMAT_STRINGS:
+		for repeat in FORMAT_REPEATS:
+			yield "format", fmt * repeat
+
+
+def cyclic_payloads():
+	for length in BOUNDARY_LENGTHS:
+		yield "cyclic", cyclic(length)
+
+
+def special_payloads():
+	for payload in SPECIAL:
+		yield "special", payload
+
+
+GENERATORS = {
+	"boundary": boundary_payloads,
+	"format": format_payloads,
+	"cyclic": cyclic_payloads,
+	"special": special_payloads,
+}
+
+
+def command_cases(command, generators):
+	for name in generators:
+		for kind, payload in GENERATORS[name]():
+			for prefix in COMMANDS[command]:
+				data = command.encode() + b" " + prefix + payload + b"\r\n"
+				yield Case(command, kind, len(payload), data)
+
+
+def generate(commands=None, generators=None):
+	#Lazy stream of Cases for the given commands (default: all of them),
+	#taking one case from each command in turn. Not a generator itself, so
+	#an unknown command or generator raises ValueError here and not on the
+	#first case.
+	commands = commands or list(COMMANDS)
+	generators = generators or list(GENERATORS)
+	for name in commands:
+		if name not in COMMANDS:
+			raise ValueError("unknown command: %s" % name)
+	for name in generators:
+		if name not in GENERATORS:
+			raise ValueError("unknown generator: %s" % name)
+	return interleave([command_cases(command, generators) for command in commands])
+
+
+def interleave(streams):
+	for cases in itertools.zip_longest(*streams):
+		for case in cases:
+			if case is not None:
+				yield case
+
+
+class Deduplicator:
+
+	#Remembers an 8 byte digest of every case sent, rather than the cases
+	#themselves, so millions of cases cost a few tens of MB at most
+
+	def __init__(self, seen=None):
+		#seen: digests sent by an earlier run (corpus.Corpus.digests), so a
+		#resumed run skips them
+		self.seen = set(seen) if seen is not None else set()
+
+	def digest(self, data):
+		#The digest the corpus stores, so its digests can seed seen
+		return digest(data)
+
+	def add(self, data):
+		#True if data is new, False if it was already sent
+		key = self.digest(data)
+		if key in self.seen:
+			return False
+		self.seen.add(key)
+		return True
+
+	def unique(self, cases):
+		for case in cases:
+			if self.add(case.data):
+				yield case
@@ -0,0 +1,124 @@
+#Cyclic (de Bruijn) patterns
+#
+#A de Bruijn sequence of order n over an alphabet contains every possible
+#n-byte string exactly once, so any n bytes read out of a crash (e.g. the
+#value in EIP) point back to exactly one offset in the pattern. With the
+#26 lowercase letters and order 4 that gives 26**4 = 456976 bytes without
+#a single repeated 4-byte window (or a single bad character).
+#
+#Usage (replaces sending "A"*2006 + "B"*4 and reading the debugger):
+#	python pattern.py create 3000
+#	python pattern.py offset 0x6161616d
+#
+#Offsets are looked up in a hash index of every window of the pattern,
+#built once, so a lookup is O(1) however long the pattern is.
+
+import functools
+import itertools
+import string
+import struct
+import sys
+
+ALPHABET = string.ascii_lowercase.encode()
+ORDER = 4
+
+
+def de_bruijn(alphabet=ALPHABET, order=ORDER):
+	#Lazily yield the de Bruijn sequence B(len(alphabet), order) one byte
+	#at a time, using the FKM (Lyndon word) algorithm
+	k = len(alphabet)
+	a = [0] * (order + 1)
+	p = 1
+	while True:
+		if order % p == 0:
+			for i in range(1, p + 1):
+				yield alphabet[a[i]]
+		#Next Lyndon word prefix
+		t = order
+		while t > 0 and a[t] == k - 1:
+			t -= 1
+		if t == 0:
+			return
+		a[t] += 1
+		for i in range(t + 1, order + 1):
+			a[i] = a[i - t]
+		p = t
+
+
+def cyclic(length, alphabet=ALPHABET, order=ORDER):
+	#The first `length` bytes of the pattern
+	if length > len(alphabet) ** order:
+		raise ValueError("pattern of order %i over %i symbols is at most %i bytes"
+			% (order, len(alphabet), len(alphabet) ** order))
+	return bytes(itertools.islice(de_bruijn(alphabet, order), length))
+
+
+@functools.lru_cache(maxsize=4)
+def pattern_index(alphabet=ALPHABET, order=ORDER):
+	#Map every `order`-byte window of the full pattern to its offset.
+	#Since every prefix of the pattern is the same bytes, one index built
+	#over the full pattern answers lookups for patterns of any length.
+	full = bytes(de_bruijn(alphabet, order))
+	index = {}
+	for offset in range(len(full) - order + 1):
+		index[full[offset:offset + order]] = offset
+	return full, index
+
+
+def find_offset(needle, alphabet=ALPHABET, order=ORDER):
+	#Offset of `needle` (e.g. the 4 bytes found in EIP, or 8 from RIP) in
+	#the pattern, or None. The first `order` bytes locate it in the
+	#index; any bytes after that only need to be checked.
+	if len(needle) < order:
+		raise ValueError("need at least %i bytes to look up an offset" % order)
+	full, index = pattern_index(alphabet, order)
+	offset = index.get(needle[:order])
+	if offset is None or full[offset:offset + len(needle)] != needle:
+		return None
+	return offset
+
+
+def parse_value(value):
+	#Turn what the debugger shows into the bytes that were in memory:
+	#"0x6161616d" or "6161616d" is a register value, stored little endian
+	#(8 hex digits for 32 bit, 16 for 64 bit); anything else is taken as
+	#the raw pattern text, e.g. "maaa" (text that also reads as hex, like
+	#"baaacaaa", is tried as text when the register reading is not found)
+	digits = value[2:] if value.lower().startswith("0x") else value
+	if len(digits) in (8, 16) and all(c in string.hexdigits for c in digits):
+		if len(digits) == 8:
+			return struct.pack("<I", int(digits, 16))
+		return struct.pack("<Q", int(digits, 16))
+	return value.encode("latin-1")
+
+
+if __name__ == "__main__":
+	try:
+		command = sys.argv[1]
+		argument = sys.argv[2]
+		if command not in ("create", "offset"):
+			raise ValueError(command)
+	except (IndexError, ValueError):
+		print("  USAGE: python pattern.py create <LENGTH>")
+		print("         python pattern.py offset <EIP VALUE | PATTERN TEXT>")
+		print("EXAMPLE: python pattern.py create 3000")
+		print("         python pattern.py offset 0x6161616d")
+		exit()
+
+	if command == "create":
+		sys.stdout.write(cyclic(int(argument)).decode() + "\n")
+	else:
+		needle = parse_value(argument)
+		offset = find_offset(needle)
+		if offset is None:
+			#Maybe the value was copied out byte for byte rather than as a
+			#register, so try it the other way around too
+			offset = find_offset(needle[::-1])
+		if offset is None and needle != argument.encode("latin-1"):
+			#Pattern text made only of the letters a-f reads as hex too
+			needle = argument.encode("latin-1")
+			offset = find_offset(needle)
+		if offset is None:
+			print("%r is not in the pattern" % needle)
+			exit(1)
+		print("Offset: %i" % offset)
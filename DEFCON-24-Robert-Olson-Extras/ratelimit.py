@@ -0,0 +1,71 @@
+#Shared rate limiter for the scan and fuzz engines
+#
+#A token bucket paces probes to `rate` per second (with a small burst), and
+#the rate itself is steered the way TCP steers its window (AIMD):
+#
+#	every `window` seconds, if more than `threshold` of the probes failed
+#	(answered only when retried, connection refused or reset) the rate is
+#	halved, otherwise it grows by a fixed step
+#
+#so a scan or fuzz run climbs to the highest rate the target sustains and
+#backs off quickly when the target (or something in between) starts
+#dropping or refusing traffic.
+
+import asyncio
+import time
+
+
+class RateLimiter:
+
+	def __init__(self, rate, min_rate=1.0, max_rate=None, increase=None, decrease=.5,
+			window=1.0, threshold=.05):
+		self.rate = float(rate)
+		self.min_rate = min_rate
+		self.max_rate = max_rate
+		self.increase = increase if increase is not None else max(1.0, self.rate / 10)
+		self.decrease = decrease
+		self.window = window
+		self.threshold = threshold
+
+		self.tokens = self.capacity()
+		self.updated = time.monotonic()
+		self.window_start = self.updated
+		self.successes = 0
+		self.failures = 0
+
+	def capacity(self):
+		#Allow bursts of about 50 ms worth of probes
+		return max(1.0, self.rate / 20)
+
+	async def acquire(self):
+		#Take a token, waiting for it if the bucket is empty. Tokens can go
+		#negative: each caller reserves its slot and sleeps until it is due,
+		#so waiters are served in order without polling.
+		now = time.monotonic()
+		self.tokens = min(self.capacity(), self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+		self.tokens -= 1
+		if self.tokens < 0:
+			await asyncio.sleep(-self.tokens / self.rate)
+
+	def record(self, ok):
+		#Report the outcome of a probe; adjusts the rate once per window
+		if ok:
+			self.successes += 1
+		else:
+			self.failures += 1
+		now = time.monotonic()
+		if now - self.window_start < self.window:
+			return
+		total = self.successes + self.failures
+		if self.failures > self.threshold * total:
+			self.rate = max(self.min_rate, self.rate * self.decrease)
+		else:
+			self.rate += self.increase
+			if self.max_rate is not None:
+				self.rate = min(self.max_rate, self.rate)
+		#Do not carry a debt built up at the old rate into the new one
+		self.tokens = max(self.tokens, -self.capacity())
+		self.window_start = now
+		self.successes = 0
+		self.failures = 0
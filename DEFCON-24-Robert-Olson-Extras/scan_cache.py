@@ -0,0 +1,147 @@
+#Persistent results cache for port-scanner.py --cache/--delta and
+#banner-grabber.py
+#
+#Every result is kept in a small SQLite database, one row per (scan mode,
+#host, port): its state, banner, service and version, when it was last
+#checked and when it last changed. Rows are written in batches, one
+#transaction per batch.
+#
+#A delta scan uses the cache to decide what is worth probing again:
+#
+#	1. ports whose last check found a change (they may still be moving,
+#	   e.g. a service coming up after a VM rebuild)
+#	2. ports last checked more than `ttl` seconds ago, oldest first
+#	3. ports the cache has never seen
+#
+#Everything else was checked recently and did not change, so it is
+#skipped. Only results that differ from the cache are reported.
+
+import sqlite3
+import time
+from collections import namedtuple
+
+from scan_engine import ScanResult
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+	mode TEXT NOT NULL,
+	host TEXT NOT NULL,
+	port INTEGER NOT NULL,
+	state TEXT NOT NULL,
+	banner BLOB,
+	service TEXT,
+	version TEXT,
+	checked REAL NOT NULL,
+	changed REAL NOT NULL,
+	PRIMARY KEY (mode, host, port)
+) WITHOUT ROWID
+"""
+
+#An open port probed without grabbing a banner keeps the banner it had.
+#Every SET expression sees the row as it was before the update.
+UPSERT = """
+INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (mode, host, port) DO UPDATE SET
+	state = excluded.state,
+	banner = CASE WHEN excluded.banner IS NULL AND excluded.state = 'open' AND state = 'open'
+		THEN banner ELSE excluded.banner END,
+	service = CASE WHEN excluded.banner IS NULL AND excluded.state = 'open' AND state = 'open'
+		THEN service ELSE excluded.service END,
+	version = CASE WHEN excluded.banner IS NULL AND excluded.state = 'open' AND state = 'open'
+		THEN version ELSE excluded.version END,
+	changed = CASE WHEN excluded.state != state
+		OR (excluded.banner IS NOT NULL AND excluded.banner IS NOT banner)
+		THEN excluded.checked ELSE changed END,
+	checked = excluded.checked
+"""
+
+Entry = namedtuple("Entry", "state banner service version checked changed")
+
+#A result reported by a delta scan: the ScanResult fields plus the state
+#the cache had for the port (None for a port it had never seen)
+Change = namedtuple("Change", ScanResult._fields + ("previous",))
+
+
+class ResultCache:
+
+	def __init__(self, path, batch_size=512):
+		self.db = sqlite3.connect(path)
+		self.db.execute(SCHEMA)
+		self.db.commit()
+		self.batch_size = batch_size
+		self.pending = []
+		#(mode, host) -> {port: Entry} for the hosts loaded by plan()
+		self.known = {}
+
+	def load(self, mode, host):
+		rows = self.db.execute("SELECT port, state, banner, service, version, checked, changed "
+			"FROM results WHERE mode = ? AND host = ?", (mode, host))
+		return dict((row[0], Entry(*row[1:])) for row in rows)
+
+	def get(self, mode, host, port):
+		row = self.db.execute("SELECT state, banner, service, version, checked, changed "
+			"FROM results WHERE mode = ? AND host = ? AND port = ?", (mode, host, port)).fetchone()
+		return Entry(*row) if row is not None else None
+
+	def plan(self, mode, hosts, ports, ttl, now=None):
+		#Order the (host, port) pairs of a delta scan as described above.
+		#Returns (pairs, number of ports skipped as fresh); the pairs the
+		#cache has never seen are generated lazily, in iter_pairs order.
+		now = time.time() if now is None else now
+		wanted = set(ports)
+		changed = []
+		stale = []
+		skipped = 0
+		for host in hosts:
+			entries = self.known[(mode, host)] = self.load(mode, host)
+			for port, entry in entries.items():
+				if port not in wanted:
+					continue
+				if entry.changed == entry.checked:
+					#Changed on its last check
+					changed.append((host, port))
+				elif now - entry.checked > ttl:
+					stale.append((entry.checked, host, port))
+				else:
+					skipped += 1
+		stale.sort()
+
+		def pairs():
+			for pair in changed:
+				yield pair
+			for checked, host, port in stale:
+				yield host, port
+			for port in ports:
+				for host in hosts:
+					if port not in self.known[(mode, host)]:
+						yield host, port
+
+		return pairs(), skipped
+
+	def diff(self, mode, result):
+		#The result as a Change if it differs from the cache, else None.
+		#Only hosts loaded by plan() are compared.
+		entry = self.known.get((mode, result.host), {}).get(result.port)
+		if entry is None:
+			return Change(*result, previous=None)
+		if result.state != entry.state or (result.banner is not None and result.banner != entry.banner):
+			return Change(*result, previous=entry.state)
+		return None
+
+	def record(self, mode, result, now=None):
+		now = time.time() if now is None else now
+		#A port seen for the first time has never changed (changed = 0)
+		self.pending.append((mode, result.host, result.port, result.state, result.banner,
+			result.service, result.version, now, 0.0))
+		if len(self.pending) >= self.batch_size:
+			self.flush()
+
+	def flush(self):
+		if self.pending:
+			with self.db:
+				self.db.executemany(UPSERT, self.pending)
+			self.pending = []
+
+	def close(self):
+		self.flush()
+		self.db.close()
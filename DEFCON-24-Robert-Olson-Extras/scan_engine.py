@@ -0,0 +1,300 @@
+#asyncio connect-scan engine used by port-scanner.py
+#
+#The original port-scanner.py connects to one port at a time and waits out
+#the whole timeout on every filtered port. This engine keeps many
+#non-blocking connects in flight at once, but classifies each port exactly
+#the way the original script does:
+#
+#	open     - the three-way handshake completed
+#	closed   - a RST came back (or any other socket error)
+#	filtered - nothing came back before the timeout
+#
+#(open|filtered is only used by the UDP scan, see udp_scan.py)
+
+import asyncio
+import errno
+import socket
+import time
+from collections import namedtuple
+
+OPEN = "open"
+CLOSED = "closed"
+FILTERED = "filtered"
+OPEN_FILTERED = "open|filtered"
+
+#rtt is the time the connect took to succeed or be refused (None if filtered)
+#banner is what an open port sent back, when banner grabbing is enabled,
+#and service/version what the fingerprint index made of it
+ScanResult = namedtuple("ScanResult", "host port state rtt banner service version",
+	defaults=(None, None, None))
+
+
+def raise_fd_limit(wanted, per_probe=1):
+	#Every connect in flight holds a file descriptor, so the soft limit
+	#(often 1024) caps the useful concurrency. Raise it towards the hard
+	#limit and return the concurrency we can actually afford. per_probe is
+	#the descriptors each unit of concurrency can hold at once: 2 with
+	#banner grabbing, whose pool is as large as the connect pool.
+	try:
+		import resource
+	except ImportError:
+		return wanted
+
+	soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+	need = wanted * per_probe + 64
+	if soft != resource.RLIM_INFINITY and soft < need:
+		if hard == resource.RLIM_INFINITY:
+			target = need
+		else:
+			target = min(need, hard)
+		try:
+			resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+			soft = target
+		except (ValueError, OSError):
+			pass
+
+	if soft == resource.RLIM_INFINITY:
+		return wanted
+	return max(1, min(wanted, (soft - 64) // per_probe))
+
+
+async def new_socket(kind=socket.SOCK_STREAM):
+	#A non-blocking socket. Out of file descriptors (more of them in use
+	#than raise_fd_limit budgeted for), wait for probes in flight to give
+	#theirs back instead of failing the whole scan.
+	while True:
+		try:
+			conn = socket.socket(socket.AF_INET, kind)
+		except OSError as e:
+			if e.errno not in (errno.EMFILE, errno.ENFILE):
+				raise
+			await asyncio.sleep(.01)
+			continue
+		conn.setblocking(False)
+		return conn
+
+
+async def run_pool(jobs, worker, concurrency):
+	#Feed every item of the (possibly lazy) jobs iterable through at most
+	#`concurrency` copies of the worker coroutine. The queue is bounded so a
+	#huge target list is never materialized in memory.
+	queue = asyncio.Queue(maxsize=concurrency * 2)
+
+	async def consume():
+		while True:
+			job = await queue.get()
+			try:
+				if job is None:
+					return
+				await worker(job)
+			finally:
+				queue.task_done()
+
+	tasks = [asyncio.ensure_future(consume()) for _ in range(concurrency)]
+	try:
+		for job in jobs:
+			await queue.put(job)
+		for _ in tasks:
+			await queue.put(None)
+		await asyncio.gather(*tasks)
+	finally:
+		for task in tasks:
+			task.cancel()
+
+
+class RttEstimator:
+
+	#Per-host connect timeout derived from measured round trip times, the
+	#same smoothed RTT / RTT variance estimate TCP (RFC 6298) and nmap use:
+	#
+	#	srtt    = 7/8 * srtt + 1/8 * rtt
+	#	rttvar  = 3/4 * rttvar + 1/4 * |srtt - rtt|
+	#	timeout = srtt + 4 * rttvar, clamped to [minimum, maximum]
+	#
+	#Until the first sample arrives the initial timeout is used. Timeouts
+	#are never fed back in, since they say nothing about the real RTT.
+
+	def __init__(self, initial, minimum, maximum):
+		self.minimum = minimum
+		self.maximum = maximum
+		self.srtt = None
+		self.rttvar = None
+		self.timeout = min(max(initial, minimum), maximum)
+
+	def update(self, rtt):
+		if self.srtt is None:
+			self.srtt = rtt
+			self.rttvar = rtt / 2
+		else:
+			self.rttvar = .75 * self.rttvar + .25 * abs(self.srtt - rtt)
+			self.srtt = .875 * self.srtt + .125 * rtt
+		self.timeout = min(max(self.srtt + 4 * self.rttvar, self.minimum), self.maximum)
+
+
+class BaseScanner:
+
+	#What every scan mode shares: the per-host RTT estimates, the timeouts
+	#and retries derived from them, and the rate limiter feedback
+
+	#State of a probe that got no answer at all, which is retried
+	RETRY_STATE = FILTERED
+
+	def __init__(self, concurrency, timeout=1.0, min_timeout=.05, max_timeout=3.0, retries=1,
+			limiter=None, stats=None):
+		self.concurrency = concurrency
+		self.initial_timeout = timeout
+		self.min_timeout = min_timeout
+		self.max_timeout = max_timeout
+		self.retries = retries
+		self.rtt = {}
+		#Optional ratelimit.RateLimiter shared with anything else hitting
+		#the same targets
+		self.limiter = limiter
+		#Optional instrument.Stats updated at every stage of a probe
+		self.stats = stats
+
+	def host_rtt(self, host):
+		estimator = self.rtt.get(host)
+		if estimator is None:
+			estimator = RttEstimator(self.initial_timeout, self.min_timeout, self.max_timeout)
+			self.rtt[host] = estimator
+		return estimator
+
+	def probe_timeout(self, host, attempt=0):
+		#The host's current timeout, doubled for every retry
+		return min(self.host_rtt(host).timeout * 2 ** attempt, self.max_timeout)
+
+	def should_retry(self, result, attempt):
+		#A probe that got no answer at all is sent again, up to retries times
+		return result.state == self.RETRY_STATE and attempt < self.retries
+
+	def feedback(self, result, attempt):
+		#Tell the rate limiter how a probe went. A timeout on its own says
+		#nothing, even on a host that answers other ports: the port may just
+		#be filtered. What shows a drop is a retry being answered after the
+		#earlier probe to the same port got nothing (the signal nmap uses),
+		#so only answers are counted, and an answer to a retry is a loss.
+		if self.limiter is not None and result.rtt is not None:
+			self.limiter.record(attempt == 0)
+
+
+class Scanner(BaseScanner):
+
+	def __init__(self, concurrency=200, timeout=1.0, min_timeout=.05, max_timeout=3.0, retries=1,
+			grab=None, fingerprints=None, limiter=None, stats=None):
+		BaseScanner.__init__(self, concurrency, timeout, min_timeout, max_timeout, retries, limiter, stats)
+		#Optional banner stage: a coroutine function (conn, port) -> bytes
+		#that is run on the socket of every port found open, and an
+		#optional FingerprintIndex to classify the banners it returns
+		self.grab = grab
+		self.fingerprints = fingerprints
+
+	async def connect(self, host, port, attempt=0):
+		#Start a non-blocking connect and wait for it as long as the host's
+		#current timeout allows, doubling it for every retry. Returns
+		#(ScanResult, socket); the socket is only returned for open ports
+		#and the caller is responsible for closing it.
+		loop = asyncio.get_running_loop()
+		estimator = self.host_rtt(host)
+		timeout = self.probe_timeout(host, attempt)
+		conn = await new_socket()
+		start = time.monotonic()
+		try:
+			await asyncio.wait_for(loop.sock_connect(conn, (host, port)), timeout)
+		except asyncio.TimeoutError:
+			conn.close()
+			return ScanResult(host, port, FILTERED, None), None
+		except OSError:
+			conn.close()
+			rtt = time.monotonic() - start
+			estimator.update(rtt)
+			return ScanResult(host, port, CLOSED, rtt), None
+		rtt = time.monotonic() - start
+		estimator.update(rtt)
+		return ScanResult(host, port, OPEN, rtt), conn
+
+	async def grab_banner(self, result, conn, callback):
+		start = time.monotonic()
+		try:
+			banner = await self.grab(conn, result.port)
+		finally:
+			conn.close()
+		if self.stats is not None:
+			self.stats.observe("banner", time.monotonic() - start)
+			self.stats.count("bytes received", len(banner))
+		service = version = None
+		if self.fingerprints is not None:
+			service, version = self.fingerprints.match(banner)
+		callback(result._replace(banner=banner, service=service, version=version))
+
+	async def scan(self, pairs, callback):
+		#Probe every (host, port) pair and hand each ScanResult to callback
+		#as soon as it is known. Ports that time out are held back and
+		#retried (with the host's by-then better RTT estimate) up to
+		#self.retries times before they are reported as filtered, so only
+		#the timed out ports pay for a second pass.
+		#
+		#With a banner stage, an open port's socket is handed straight to
+		#it in a task of its own, so slow banners never hold a scan worker.
+		#The number of banner tasks is bounded by the same concurrency: a
+		#worker takes a banner slot before handing its socket over, so when
+		#the banner stage falls behind the workers wait, rather than open
+		#sockets piling up behind it.
+		retry = []
+		grabs = set()
+		grab_slots = asyncio.Semaphore(self.concurrency)
+
+		async def grab(result, conn):
+			try:
+				await self.grab_banner(result, conn, callback)
+			finally:
+				grab_slots.release()
+
+		async def worker(job):
+			host, port, attempt = job
+			if self.limiter is not None:
+				await self.limiter.acquire()
+			if self.stats is not None:
+				self.stats.start()
+				start = time.monotonic()
+			result, conn = await self.connect(host, port, attempt)
+			retrying = self.should_retry(result, attempt)
+			if self.stats is not None:
+				self.stats.finish("connect", time.monotonic() - start)
+				#Every probe that got no answer is a timeout, but a port is
+				#only counted under its state once, when the state is final
+				if result.rtt is None and result.state == self.RETRY_STATE:
+					self.stats.count("timeouts")
+				if not retrying:
+					self.stats.count(result.state)
+			self.feedback(result, attempt)
+			if conn is not None:
+				if self.grab is None:
+					conn.close()
+				else:
+					try:
+						await grab_slots.acquire()
+					except BaseException:
+						conn.close()
+						raise
+					task = asyncio.ensure_future(grab(result, conn))
+					grabs.add(task)
+					task.add_done_callback(grabs.discard)
+					return
+			if retrying:
+				retry.append((host, port, attempt + 1))
+			else:
+				callback(result)
+
+		jobs = ((host, port, 0) for host, port in pairs)
+		try:
+			while True:
+				await run_pool(jobs, worker, self.concurrency)
+				if not retry:
+					break
+				jobs, retry = retry, []
+			if grabs:
+				await asyncio.gather(*grabs)
+		finally:
+			for task in grabs:
+				task.cancel()
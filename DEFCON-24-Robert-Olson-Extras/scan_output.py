@@ -0,0 +1,153 @@
+#Result sinks for port-scanner.py
+#
+#A sink receives each ScanResult the moment the engine knows it, drops the
+#states it was not asked for (e.g. everything but "open") and writes the
+#rest as text, JSON Lines or CSV. Records are buffered and written out in
+#batches, so a 65535 port scan does not cost 65535 terminal writes.
+
+import csv
+import io
+import json
+import sys
+import time
+
+
+class ResultSink:
+
+	def __init__(self, stream=None, states=None, batch_size=256, flush_interval=1.0):
+		self.stream = stream if stream is not None else sys.stdout
+		self.states = set(states) if states else None
+		self.batch_size = batch_size
+		self.flush_interval = flush_interval
+		self.pending = []
+		self.last_flush = time.monotonic()
+		self.count = 0
+		self.need_header = True
+
+	def format(self, result):
+		raise NotImplementedError
+
+	def header(self, result):
+		return None
+
+	def write(self, result):
+		if self.states is None or result.state in self.states:
+			if self.need_header:
+				header = self.header(result)
+				if header is not None:
+					self.pending.append(header)
+				self.need_header = False
+			self.count += 1
+			self.pending.append(self.format(result))
+			if len(self.pending) >= self.batch_size:
+				self.flush()
+				return
+		#Checked for every result, reported or not, so with --open-only an
+		#open port found during a long run of closed ones still shows up
+		#within flush_interval instead of waiting for the next open port
+		if self.pending and time.monotonic() - self.last_flush >= self.flush_interval:
+			self.flush()
+
+	def flush(self):
+		if self.pending:
+			self.stream.write("".join(self.pending))
+			self.pending = []
+		self.stream.flush()
+		self.last_flush = time.monotonic()
+
+	def close(self):
+		self.flush()
+		if self.stream not in (sys.stdout, sys.stderr):
+			self.stream.close()
+
+
+class TextSink(ResultSink):
+
+	#The same "Port 80 is open." lines the original script printed,
+	#prefixed with the host when more than one host is being scanned. A
+	#delta scan's changes (scan_cache.Change) say what the port was before.
+
+	def __init__(self, stream=None, states=None, show_host=False, **kwargs):
+		ResultSink.__init__(self, stream, states, **kwargs)
+		self.show_host = show_host
+
+	def format(self, result):
+		state = result.state
+		if hasattr(result, "previous"):
+			if result.previous is None:
+				state += " (new)"
+			elif result.previous != result.state:
+				state += " (was %s)" % result.previous
+			else:
+				state += " (banner changed)"
+		if self.show_host:
+			line = "%s: Port %i is %s.\n" % (result.host, result.port, state)
+		else:
+			line = "Port %i is %s.\n" % (result.port, state)
+		if result.banner:
+			#Show the first line of the banner, indented under the port
+			first = result.banner.decode("latin-1").strip().split("\n", 1)[0].strip()
+			if result.service:
+				first = "[%s] %s" % (" ".join(filter(None, (result.service, result.version))), first)
+			line += "\t%s\n" % first
+		return line
+
+
+def record(result):
+	#ScanResult as a plain dict, with bytes fields decoded so they survive
+	#JSON and CSV
+	fields = result._asdict()
+	for name, value in fields.items():
+		if isinstance(value, bytes):
+			fields[name] = value.decode("latin-1")
+		elif isinstance(value, float):
+			fields[name] = round(value, 6)
+	return fields
+
+
+class JsonlSink(ResultSink):
+
+	def format(self, result):
+		return json.dumps(record(result)) + "\n"
+
+
+class CsvSink(ResultSink):
+
+	def __init__(self, stream=None, states=None, **kwargs):
+		ResultSink.__init__(self, stream, states, **kwargs)
+		self.buffer = io.StringIO()
+		self.writer = csv.writer(self.buffer, lineterminator="\n")
+
+	def row(self, values):
+		self.writer.writerow(values)
+		line = self.buffer.getvalue()
+		self.buffer.seek(0)
+		self.buffer.truncate()
+		return line
+
+	def header(self, result):
+		return self.row(result._fields)
+
+	def format(self, result):
+		return self.row(record(result).values())
+
+
+SINKS = {
+	"text": TextSink,
+	"jsonl": JsonlSink,
+	"csv": CsvSink,
+}
+
+
+def open_sink(fmt, path=None, states=None, append=False, **kwargs):
+	#Build the sink for --format/--output; "-" or no path means stdout.
+	#With append (resuming a scan) an existing file is continued, and a
+	#CSV header is only written if the file is still empty.
+	if path is None or path == "-":
+		stream = sys.stdout
+	else:
+		stream = open(path, "a" if append else "w", newline="")
+	sink = SINKS[fmt](stream, states, **kwargs)
+	if append and stream is not sys.stdout and stream.tell() > 0:
+		sink.need_header = False
+	return sink
@@ -0,0 +1,193 @@
+#Checkpoints for resuming interrupted scans (port-scanner.py --resume)
+#
+#Every (host, port) whose final result has been reported is marked in a
+#list of ranges for its host. The ranges are of positions in the scan's
+#sorted port list rather than of port numbers, so -p 22,80,443 done on a
+#host is the single range 0-2, and a host whose ports finish in order
+#(which iter_pairs makes the usual case) costs two integers however many
+#ports it has. Out of order results, such as ports waiting for a retry,
+#only split a range until they are done.
+#
+#The ranges are written out every few seconds to a small JSON file that is
+#replaced atomically, so a scan killed by a VM snapshot or a laptop going
+#to sleep loses at most a few seconds of work. Only the hosts marked since
+#the last save are encoded again, and the file is written by a background
+#thread, so saving never holds up the event loop (and the connects waiting
+#on it) even with tens of thousands of hosts.
+#
+#Ports still waiting for a retry are not marked, so a resumed scan probes
+#them again.
+
+import bisect
+import json
+import os
+import threading
+import time
+
+VERSION = 2
+
+
+def add(bounds, i):
+	#Add i to sorted, disjoint [start, end) ranges flattened into a list:
+	#[start, end, start, end, ...]
+	k = bisect.bisect_right(bounds, i)
+	if k & 1:
+		#Already inside a range
+		return
+	extends = k > 0 and bounds[k - 1] == i
+	joins = k < len(bounds) and bounds[k] == i + 1
+	if extends and joins:
+		del bounds[k - 1:k + 1]
+	elif extends:
+		bounds[k - 1] = i + 1
+	elif joins:
+		bounds[k] = i
+	else:
+		bounds[k:k] = [i, i + 1]
+
+
+def contains(bounds, i):
+	return bisect.bisect_right(bounds, i) & 1 == 1
+
+
+def encode(bounds):
+	#[0, 3, 5, 6] -> "0-2,5"
+	parts = []
+	for k in range(0, len(bounds), 2):
+		first, last = bounds[k], bounds[k + 1] - 1
+		parts.append("%i-%i" % (first, last) if last > first else "%i" % first)
+	return ",".join(parts)
+
+
+def decode(text):
+	bounds = []
+	for part in text.split(","):
+		if part:
+			first, _, last = part.partition("-")
+			bounds += [int(first), int(last or first) + 1]
+	return bounds
+
+
+class Checkpoint:
+
+	def __init__(self, path, mode, ports, interval=5.0):
+		#mode is the kind of scan (connect, syn, udp); a checkpoint of one
+		#kind says nothing about the other. ports is the sorted list of
+		#ports being scanned, which positions are counted in.
+		self.path = path
+		self.mode = mode
+		self.ports = ports
+		self.port_ranges = []
+		for port in ports:
+			add(self.port_ranges, port)
+		self.interval = interval
+		#Called before every save, e.g. to flush the result sink so no port
+		#is marked done before its result is on disk
+		self.before_save = None
+		self.ranges = {}
+		#Hosts marked since the last save, and the encoded ranges of every
+		#host as of the last save
+		self.dirty = set()
+		self.encoded = {}
+		self.writer = None
+		self.error = None
+		self.last_save = time.monotonic()
+
+	@classmethod
+	def load(cls, path, mode, ports, interval=5.0):
+		with open(path) as f:
+			state = json.load(f)
+		if state.get("version") != VERSION:
+			raise ValueError("%s: unsupported checkpoint version" % path)
+		if state.get("mode") != mode:
+			raise ValueError("%s is a checkpoint of a %s scan, not a %s scan" % (path, state.get("mode"), mode))
+		checkpoint = cls(path, mode, ports, interval)
+		if decode(state["ports"]) != checkpoint.port_ranges:
+			raise ValueError("%s is a checkpoint of a scan of ports %s, not %s" % (path, state["ports"],
+				encode(checkpoint.port_ranges)))
+		for host, text in state["hosts"].items():
+			checkpoint.ranges[host] = decode(text)
+			checkpoint.encoded[host] = text
+		return checkpoint
+
+	def position(self, port):
+		i = bisect.bisect_left(self.ports, port)
+		return i if i < len(self.ports) and self.ports[i] == port else None
+
+	def done(self, host, port):
+		bounds = self.ranges.get(host)
+		if bounds is None:
+			return False
+		i = self.position(port)
+		return i is not None and contains(bounds, i)
+
+	def mark(self, host, port):
+		i = self.position(port)
+		if i is None:
+			return
+		bounds = self.ranges.get(host)
+		if bounds is None:
+			bounds = self.ranges[host] = []
+		add(bounds, i)
+		self.dirty.add(host)
+		if time.monotonic() - self.last_save >= self.interval:
+			self.save(wait=False)
+
+	def pending(self, pairs):
+		#Skip the pairs an earlier run already finished
+		for host, port in pairs:
+			if not self.done(host, port):
+				yield host, port
+
+	def count(self):
+		return sum(bounds[k + 1] - bounds[k] for bounds in self.ranges.values() for k in range(0, len(bounds), 2))
+
+	def write(self, state):
+		try:
+			tmp = self.path + ".tmp"
+			with open(tmp, "w") as f:
+				json.dump(state, f)
+			os.replace(tmp, self.path)
+		except OSError as e:
+			self.error = e
+
+	def join(self):
+		#Wait for the background write, if any, and raise its error
+		if self.writer is not None:
+			self.writer.join()
+			self.writer = None
+		if self.error is not None:
+			error, self.error = self.error, None
+			raise error
+
+	def save(self, wait=True):
+		#Without wait, a save still being written is left to finish and
+		#this one happens on the next mark instead
+		if self.writer is not None and self.writer.is_alive() and not wait:
+			return
+		self.join()
+		if self.before_save is not None:
+			self.before_save()
+		for host in self.dirty:
+			self.encoded[host] = encode(self.ranges[host])
+		self.dirty = set()
+		state = {
+			"version": VERSION,
+			"mode": self.mode,
+			"ports": encode(self.port_ranges),
+			"hosts": dict(self.encoded),
+		}
+		self.writer = threading.Thread(target=self.write, args=(state,))
+		self.writer.start()
+		self.last_save = time.monotonic()
+		if wait:
+			self.join()
+
+	def remove(self):
+		#Nothing left to resume, so a failed save no longer matters
+		if self.writer is not None:
+			self.writer.join()
+		try:
+			os.remove(self.path)
+		except FileNotFoundError:
+			pass
@@ -0,0 +1,76 @@
+#Target parsing for port-scanner.py
+#
+#Hosts can be given as single addresses, hostnames or CIDR blocks
+#("192.168.56.0/24"), or read from a file with one target per line.
+#Ports are given as range expressions such as "1-1024,3389,8000-8100".
+
+import ipaddress
+import socket
+
+
+def parse_ports(spec):
+	#Turn "1-1024,3389,8000-8100" into a sorted list of unique ports
+	ports = set()
+	for part in spec.split(","):
+		part = part.strip()
+		if not part:
+			continue
+		if "-" in part:
+			low, high = part.split("-", 1)
+			low = int(low) if low else 1
+			high = int(high) if high else 65535
+		else:
+			low = high = int(part)
+		if not 1 <= low <= high <= 65535:
+			raise ValueError("invalid port range: %s" % part)
+		ports.update(range(low, high + 1))
+	if not ports:
+		raise ValueError("no ports in %r" % spec)
+	return sorted(ports)
+
+
+def read_host_file(path):
+	#One target per line; blank lines and "#" comments are ignored
+	specs = []
+	with open(path) as f:
+		for line in f:
+			line = line.split("#", 1)[0].strip()
+			if line:
+				specs.extend(line.split())
+	return specs
+
+
+def expand_hosts(specs):
+	#Expand addresses, hostnames and CIDR blocks into a list of unique IPv4
+	#addresses, keeping the order they were given in. Hostnames are resolved
+	#once here so the scan loop never waits on DNS.
+	hosts = []
+	seen = set()
+	for spec in specs:
+		if "/" in spec:
+			network = ipaddress.ip_network(spec, strict=False)
+			if network.num_addresses == 1:
+				addresses = [network.network_address]
+			else:
+				addresses = network.hosts()
+			addresses = (str(address) for address in addresses)
+		else:
+			try:
+				addresses = [socket.gethostbyname(spec)]
+			except socket.gaierror:
+				raise ValueError("cannot resolve host: %s" % spec)
+		for address in addresses:
+			if address not in seen:
+				seen.add(address)
+				hosts.append(address)
+	return hosts
+
+
+def iter_pairs(hosts, ports):
+	#Yield (host, port) pairs port-major, i.e. port 1 on every host, then
+	#port 2 on every host, and so on. This spreads each host's probes out
+	#over the whole scan, so one filtered host never fills the worker pool
+	#with its timeouts while the other hosts wait.
+	for port in ports:
+		for host in hosts:
+			yield (host, port)
@@ -0,0 +1,226 @@
+#SYN (half-open) scan mode for port-scanner.py -sS
+#
+#A connect scan does the full three-way handshake and needs a socket (and a
+#file descriptor) per probe. A SYN scan only sends the first packet of the
+#handshake itself, through a raw socket, and looks at what comes back:
+#
+#	SYN/ACK  - open (our kernel has no socket for it and answers with a
+#	           RST, so the handshake is never completed)
+#	RST      - closed
+#	nothing  - filtered, after the host's timeout and any retries
+#
+#One raw socket sends every probe and a single receive loop matches the
+#replies. Probes in flight are kept in a dict keyed by a packed
+#(address, port) integer, and the sequence number of every SYN is derived
+#from a secret and the target, so a reply can be checked without storing
+#anything per probe. This mode needs root and Linux/BSD raw sockets.
+
+import asyncio
+import errno
+import hashlib
+import heapq
+import os
+import random
+import socket
+import struct
+import time
+
+from scan_engine import CLOSED, FILTERED, OPEN, BaseScanner, ScanResult
+
+SYN = 0x02
+RST = 0x04
+ACK = 0x10
+
+#TCP options sent with every SYN: MSS 1460, like a normal connect would
+OPTIONS = b"\x02\x04\x05\xb4"
+
+
+def checksum(data):
+	if len(data) % 2:
+		data += b"\x00"
+	total = sum(struct.unpack("!%iH" % (len(data) // 2), data))
+	while total >> 16:
+		total = (total & 0xffff) + (total >> 16)
+	return ~total & 0xffff
+
+
+def source_address(host):
+	#The local address the kernel would use to reach host, found by
+	#"connecting" a UDP socket (which sends nothing)
+	probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	try:
+		probe.connect((host, 9))
+		return probe.getsockname()[0]
+	finally:
+		probe.close()
+
+
+def syn_packet(src, dst, sport, dport, seq):
+	offset = (5 + len(OPTIONS) // 4) << 4
+	header = struct.pack("!HHIIBBHHH", sport, dport, seq, 0, offset, SYN, 1024, 0, 0) + OPTIONS
+	pseudo = socket.inet_aton(src) + socket.inet_aton(dst) + struct.pack("!BBH", 0, socket.IPPROTO_TCP, len(header))
+	csum = checksum(pseudo + header)
+	return header[:16] + struct.pack("!H", csum) + header[18:]
+
+
+class SynScanner(BaseScanner):
+
+	def __init__(self, concurrency=1000, timeout=1.0, min_timeout=.05, max_timeout=3.0, retries=1, limiter=None,
+			stats=None):
+		#concurrency is the number of probes in flight, which here costs a
+		#dict entry rather than a file descriptor
+		BaseScanner.__init__(self, concurrency, timeout, min_timeout, max_timeout, retries, limiter, stats)
+		self.secret = os.urandom(16)
+		self.sport = random.randint(40000, 60000)
+		self.sources = {}
+
+	def cookie(self, key):
+		#Sequence number for the SYN to key; a valid reply ACKs cookie + 1
+		digest = hashlib.blake2b(struct.pack("!Q", key), key=self.secret, digest_size=4).digest()
+		return struct.unpack("!I", digest)[0]
+
+	def open_socket(self):
+		try:
+			raw = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP)
+		except PermissionError:
+			raise PermissionError("SYN scan needs raw sockets, run as root")
+		raw.setblocking(False)
+		raw.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+		return raw
+
+	async def scan(self, pairs, callback):
+		loop = asyncio.get_running_loop()
+		raw = self.open_socket()
+
+		#key -> (host, port, attempt, send time)
+		inflight = {}
+		#(deadline, key, attempt) of every probe sent, soonest first
+		deadlines = []
+		slots = asyncio.Semaphore(self.concurrency)
+		retry = []
+		done = asyncio.Event()
+
+		def finish(key, result):
+			entry = inflight.pop(key)
+			slots.release()
+			if self.stats is not None:
+				self.stats.finish("connect", time.monotonic() - entry[3])
+				self.stats.count(result.state)
+			callback(result)
+
+		def receive():
+			while True:
+				try:
+					packet = raw.recv(65535)
+				except (BlockingIOError, InterruptedError):
+					return
+				except OSError:
+					return
+				ihl = (packet[0] & 0x0f) * 4
+				if len(packet) < ihl + 14:
+					continue
+				sport, dport, seq, ack, _, flags = struct.unpack("!HHIIBB", packet[ihl:ihl + 14])
+				if dport != self.sport:
+					continue
+				key = struct.unpack("!I", packet[12:16])[0] << 16 | sport
+				entry = inflight.get(key)
+				if entry is None or ack != (self.cookie(key) + 1) & 0xffffffff:
+					continue
+				host, port, attempt, sent = entry
+				rtt = time.monotonic() - sent
+				if self.stats is not None:
+					self.stats.count("bytes received", len(packet))
+				self.host_rtt(host).update(rtt)
+				if flags & SYN and flags & ACK:
+					result = ScanResult(host, port, OPEN, rtt)
+				elif flags & RST:
+					result = ScanResult(host, port, CLOSED, rtt)
+				else:
+					continue
+				finish(key, result)
+				self.feedback(result, attempt)
+
+		async def expire():
+			#Time out probes whose deadline passed without a reply
+			while not done.is_set() or inflight:
+				now = time.monotonic()
+				while deadlines and deadlines[0][0] <= now:
+					_, key, attempt = heapq.heappop(deadlines)
+					entry = inflight.get(key)
+					if entry is None or entry[2] != attempt:
+						continue
+					host, port = entry[0], entry[1]
+					result = ScanResult(host, port, FILTERED, None)
+					if self.should_retry(result, attempt):
+						#Give the slot back and send this port again later
+						del inflight[key]
+						slots.release()
+						if self.stats is not None:
+							self.stats.finish("connect", now - entry[3])
+							self.stats.count("timeouts")
+						retry.append((host, port, attempt + 1))
+					else:
+						if self.stats is not None:
+							self.stats.count("timeouts")
+						finish(key, result)
+				await asyncio.sleep(.01)
+
+		async def send(host, port, attempt):
+			await slots.acquire()
+			if self.limiter is not None:
+				await self.limiter.acquire()
+			key = struct.unpack("!I", socket.inet_aton(host))[0] << 16 | port
+			inflight[key] = (host, port, attempt, time.monotonic())
+			if self.stats is not None:
+				self.stats.start()
+			try:
+				src = self.sources.get(host)
+				if src is None:
+					src = self.sources[host] = source_address(host)
+				packet = syn_packet(src, host, self.sport, port, self.cookie(key))
+				while True:
+					try:
+						raw.sendto(packet, (host, 0))
+						break
+					except (BlockingIOError, InterruptedError):
+						await asyncio.sleep(.001)
+					except OSError as e:
+						if e.errno != errno.ENOBUFS:
+							raise
+						await asyncio.sleep(.001)
+			except OSError:
+				#The SYN never left this machine: a broadcast address
+				#(EACCES), no route, a firewall rule... Nothing to time and
+				#nothing to retry.
+				finish(key, ScanResult(host, port, FILTERED, None))
+				return
+			now = time.monotonic()
+			timeout = self.probe_timeout(host, attempt)
+			inflight[key] = (host, port, attempt, now)
+			if self.stats is not None:
+				self.stats.count("bytes sent", len(packet))
+			heapq.heappush(deadlines, (now + timeout, key, attempt))
+			#Let the receive loop run now and then on very large scans
+			await asyncio.sleep(0)
+
+		loop.add_reader(raw.fileno(), receive)
+		expiry = asyncio.ensure_future(expire())
+		try:
+			for host, port in pairs:
+				await send(host, port, 0)
+			while True:
+				#Wait for the in-flight probes to finish, then resend the
+				#ones that timed out
+				while inflight:
+					await asyncio.sleep(.01)
+				if not retry:
+					break
+				jobs, retry = retry, []
+				for job in jobs:
+					await send(*job)
+			done.set()
+			await expiry
+		finally:
+			loop.remove_reader(raw.fileno())
+			expiry.cancel()
+			raw.close()
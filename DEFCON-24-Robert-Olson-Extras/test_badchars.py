@@ -0,0 +1,88 @@
+#Regression tests for badchars.compare (python -m unittest test_badchars)
+
+import random
+import unittest
+
+import numpy
+
+import badchars
+
+
+def run(sent, dump):
+	return badchars.compare(numpy.frombuffer(sent, numpy.uint8), numpy.frombuffer(dump, numpy.uint8))
+
+
+class CompareTest(unittest.TestCase):
+
+	def setUp(self):
+		self.sent = badchars.test_string()
+
+	def test_intact(self):
+		self.assertEqual(run(self.sent, self.sent + b"junk"), ([], None))
+
+	def test_replaced(self):
+		dump = self.sent.replace(b"\x0a", b"\x00")
+		self.assertEqual(run(self.sent, dump), ([(9, 0x0a, b"\x00")], None))
+
+	def test_dropped(self):
+		dump = self.sent.replace(b"\x0d", b"")
+		self.assertEqual(run(self.sent, dump), ([(12, 0x0d, b"")], None))
+
+	def test_expanded(self):
+		dump = self.sent.replace(b"\x0d", b"\x20\x20")
+		self.assertEqual(run(self.sent, dump), ([(12, 0x0d, b"\x20\x20")], None))
+
+	def test_doubled(self):
+		dump = self.sent.replace(b"\x40", b"\x40\x40")
+		self.assertEqual(run(self.sent, dump), ([(63, 0x40, b"\x40\x40")], None))
+
+	def test_adjacent(self):
+		dump = self.sent.replace(b"\x0a\x0b\x0c", b"\x20\x20\x20")
+		mangled, truncated = run(self.sent, dump)
+		self.assertEqual(mangled, [(9, 0x0a, b"\x20"), (10, 0x0b, b"\x20"), (11, 0x0c, b"\x20")])
+		self.assertIsNone(truncated)
+
+	def test_adjacent_dropped(self):
+		dump = self.sent.replace(b"\x0a\x0b", b"")
+		mangled, truncated = run(self.sent, dump)
+		self.assertEqual(mangled, [(9, 0x0a, b""), (10, 0x0b, b"")])
+		self.assertIsNone(truncated)
+
+	def test_range_uppercased(self):
+		#0x61-0x7a ("a"-"z") uppercased by the target
+		dump = self.sent[:0x60] + self.sent[0x60:0x7a].upper() + self.sent[0x7a:]
+		mangled, truncated = run(self.sent, dump)
+		self.assertIsNone(truncated)
+		self.assertEqual([byte for offset, byte, instead in mangled], list(range(0x61, 0x7b)))
+		self.assertEqual([instead for offset, byte, instead in mangled], [bytes([b]) for b in range(0x41, 0x5b)])
+
+	def test_range_and_single(self):
+		dump = self.sent[:0x60] + self.sent[0x60:0x7a].upper() + self.sent[0x7a:]
+		dump = dump.replace(b"\xff", b"\x00")
+		mangled, truncated = run(self.sent, dump)
+		self.assertIsNone(truncated)
+		self.assertEqual(len(mangled), 27)
+		self.assertEqual(mangled[-1], (0xfe, 0xff, b"\x00"))
+
+	def test_truncated(self):
+		dump = self.sent[:0x1f] + bytes(range(200, 0, -1))
+		mangled, truncated = run(self.sent, dump)
+		self.assertEqual(truncated, 0x1f)
+
+	def test_truncated_random(self):
+		#Stack garbage after the truncation must not line up by chance
+		rng = random.Random(1)
+		for _ in range(500):
+			garbage = bytes(rng.randrange(256) for _ in range(400))
+			if garbage[0] == self.sent[0x1f]:
+				continue
+			self.assertEqual(run(self.sent, self.sent[:0x1f] + garbage), ([], 0x1f))
+
+	def test_close_together(self):
+		#0x0a and 0x0d are only two bytes apart
+		dump = self.sent.replace(b"\x0a", b"\x00").replace(b"\x0d", b"\x00")
+		self.assertEqual(run(self.sent, dump), ([(9, 0x0a, b"\x00"), (12, 0x0d, b"\x00")], None))
+
+
+if __name__ == "__main__":
+	unittest.main()
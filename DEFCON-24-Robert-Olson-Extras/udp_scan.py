@@ -0,0 +1,174 @@
+#UDP scan mode for port-scanner.py -sU
+#
+#UDP has no handshake, so a probe is a datagram and the port state comes
+#from what happens next:
+#
+#	a reply                       - open
+#	ICMP port unreachable         - closed
+#	another ICMP unreachable      - filtered
+#	nothing, even after retries   - open|filtered
+#
+#Empty datagrams are ignored by most services, so well known ports get a
+#payload their protocol will answer (DNS, SNMP, TFTP, NTP, ...). Each probe
+#uses a connected UDP socket: the kernel then reports the ICMP error for
+#that socket, which asyncio hands us as error_received, so no raw sockets
+#or root are needed.
+#
+#Targets rate limit the ICMP errors they send (Linux: about one per second
+#per source after a short burst). Probing faster than that just turns
+#closed ports into open|filtered and costs retries, so probes to each host
+#are paced, and the pace is halved whenever a retry shows an ICMP error
+#was lost.
+
+import asyncio
+import socket
+import time
+
+from scan_engine import CLOSED, FILTERED, OPEN, OPEN_FILTERED, ScanResult, Scanner, new_socket
+
+
+def ber(tag, content):
+	#Minimal BER encoding for the SNMP probe (short lengths only)
+	return bytes([tag, len(content)]) + content
+
+
+SNMP_SYSDESCR = ber(0x30,
+	ber(0x02, b"\x00")				#version: 1
+	+ ber(0x04, b"public")				#community
+	+ ber(0xa0,					#GetRequest
+		ber(0x02, b"\x13\x37\x13\x37")		#request id
+		+ ber(0x02, b"\x00")			#error status
+		+ ber(0x02, b"\x00")			#error index
+		+ ber(0x30, ber(0x30,			#one varbind:
+			ber(0x06, b"\x2b\x06\x01\x02\x01\x01\x01\x00")	#sysDescr.0
+			+ ber(0x05, b"")))))		#NULL
+
+PAYLOADS = {
+	#DNS: query for the root NS records
+	53: b"\x13\x37\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00\x02\x00\x01",
+	#TFTP: read request, answered with a file or an error packet
+	69: b"\x00\x01r7tftp.txt\x00octet\x00",
+	#NTP: version 4 client request
+	123: b"\xe3" + b"\x00" * 47,
+	#NetBIOS: node status request for "*"
+	137: b"\x13\x37\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00"
+		b"\x20CKAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA\x00\x00\x21\x00\x01",
+	#SNMP v1 get sysDescr.0 with community "public"
+	161: SNMP_SYSDESCR,
+	#SSDP discovery
+	1900: b"M-SEARCH * HTTP/1.1\r\nHOST: 239.255.255.250:1900\r\n"
+		b"MAN: \"ssdp:discover\"\r\nMX: 1\r\nST: ssdp:all\r\n\r\n",
+}
+
+
+class ProbeProtocol(asyncio.DatagramProtocol):
+
+	def __init__(self):
+		self.outcome = asyncio.get_running_loop().create_future()
+
+	def datagram_received(self, data, addr):
+		if not self.outcome.done():
+			self.outcome.set_result(data)
+
+	def error_received(self, exc):
+		if not self.outcome.done():
+			self.outcome.set_exception(exc)
+
+	def connection_lost(self, exc):
+		if not self.outcome.done():
+			self.outcome.cancel()
+
+
+class HostPacer:
+
+	#Spaces out the probes sent to one host to at most `rate` per second
+
+	def __init__(self, rate, min_rate=1.0):
+		self.rate = rate
+		self.min_rate = min_rate
+		self.next_send = 0.0
+
+	async def wait(self):
+		now = time.monotonic()
+		slot = max(now, self.next_send)
+		self.next_send = slot + 1.0 / self.rate
+		if slot > now:
+			await asyncio.sleep(slot - now)
+
+	def backoff(self):
+		self.rate = max(self.min_rate, self.rate / 2)
+
+
+class UdpScanner(Scanner):
+
+	#Only the probe differs from the connect scan: the pool, the per-host
+	#RTT timeouts and the retries all come from Scanner. A port without
+	#any answer is what gets retried here.
+	RETRY_STATE = OPEN_FILTERED
+
+	def __init__(self, concurrency=200, timeout=1.0, min_timeout=.05, max_timeout=3.0, retries=2,
+			rate=50.0, payloads=PAYLOADS, limiter=None, stats=None):
+		Scanner.__init__(self, concurrency, timeout, min_timeout, max_timeout, retries,
+			limiter=limiter, stats=stats)
+		self.rate = rate
+		self.payloads = payloads
+		self.pacers = {}
+
+	def host_pacer(self, host):
+		pacer = self.pacers.get(host)
+		if pacer is None:
+			pacer = self.pacers[host] = HostPacer(self.rate)
+		return pacer
+
+	async def connect(self, host, port, attempt=0):
+		loop = asyncio.get_running_loop()
+		estimator = self.host_rtt(host)
+		pacer = self.host_pacer(host)
+		await pacer.wait()
+
+		timeout = self.probe_timeout(host, attempt)
+		conn = await new_socket(socket.SOCK_DGRAM)
+		transport = None
+		start = None
+		try:
+			#connect() sends nothing on a UDP socket, but it and the send
+			#can still fail locally: a broadcast address (EACCES), no route
+			#(ENETUNREACH), a firewall rule (EPERM), ...
+			conn.connect((host, port))
+			transport, protocol = await loop.create_datagram_endpoint(ProbeProtocol, sock=conn)
+			#Sent on the socket itself: asyncio silently drops empty
+			#datagrams, and an empty one is the right probe for most ports
+			payload = self.payloads.get(port, b"")
+			conn.send(payload)
+			start = time.monotonic()
+			if self.stats is not None:
+				self.stats.count("bytes sent", len(payload))
+			reply = await asyncio.wait_for(protocol.outcome, timeout)
+			if self.stats is not None:
+				self.stats.count("bytes received", len(reply))
+			state = OPEN
+		except asyncio.TimeoutError:
+			return ScanResult(host, port, OPEN_FILTERED, None), None
+		except ConnectionRefusedError:
+			state = CLOSED
+		except OSError:
+			if start is None:
+				#Never left this machine: nothing to time, and nothing to
+				#retry either
+				return ScanResult(host, port, FILTERED, None), None
+			#Any other ICMP error: host or network unreachable,
+			#administratively prohibited, ...
+			state = FILTERED
+		finally:
+			if transport is not None:
+				transport.close()
+			else:
+				conn.close()
+
+		rtt = time.monotonic() - start
+		estimator.update(rtt)
+		if attempt and state == CLOSED:
+			#The first probe got no ICMP error but this one did, so the
+			#target dropped it: slow down
+			pacer.backoff()
+		return ScanResult(host, port, state, rtt), None
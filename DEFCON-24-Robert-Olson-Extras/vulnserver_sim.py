@@ -0,0 +1,227 @@
+#Local stand-in for VulnServer, for exercising and benchmarking the kit on
+#a plain Linux box instead of the Windows VM from setup.txt
+#
+#It speaks enough of VulnServer's protocol for port-scanner.py,
+#banner-grabber.py and fuzzer.py: the welcome banner, HELP, EXIT and the
+#usual commands. Input longer than a command's crash length "crashes" the
+#server, which (depending on --crash-mode) either just drops the
+#connection, stops listening for a while, or exits the process.
+#
+#It can also simulate the other port states the scanner has to deal with:
+#
+#	closed   - any port nothing listens on (the kernel answers with a RST)
+#	filtered - --filtered ports: a listener whose accept queue is kept full,
+#	           so the kernel silently drops new SYNs (Linux behaviour)
+#	slow     - --slow ports: VulnServer, but every banner and reply is
+#	           delayed by --latency seconds
+
+import argparse
+import asyncio
+import random
+import socket
+
+from scan_targets import parse_ports
+
+BANNER = b"Welcome to Vulnerable Server! Enter HELP for help.\n"
+
+HELP = (b"Valid Commands:\n"
+	b"HELP\nSTATS [stat_value]\nRTIME [rtime_value]\nLTIME [ltime_value]\n"
+	b"SRUN [srun_value]\nTRUN [trun_value]\nGMON [gmon_value]\nGDOG [gdog_value]\n"
+	b"KSTET [kstet_value]\nGTER [gter_value]\nHTER [hter_value]\nLTER [lter_value]\n"
+	b"KSTAN [lstan_value]\nEXIT\n")
+
+REPLIES = {
+	b"STATS": b"STATS VALUE NORMAL\n",
+	b"RTIME": b"RTIME VALUE WITHIN LIMITS\n",
+	b"LTIME": b"LTIME VALUE HIGH, BUT OK\n",
+	b"SRUN": b"SRUN COMPLETE\n",
+	b"TRUN": b"TRUN COMPLETE\n",
+	b"GMON": b"GOODBYE\n",
+	b"GDOG": b"GDOG RUNNING\n",
+	b"KSTET": b"KSTET SUCCESSFUL\n",
+	b"GTER": b"GTER ON TRACK\n",
+	b"HTER": b"HTER RUNNING FINE\n",
+	b"LTER": b"LTER COMPLETE\n",
+	b"KSTAN": b"KSTAN UNDERWAY\n",
+}
+
+#Command -> (byte the argument must contain, argument length that crashes
+#it), roughly matching the real VulnServer's vulnerable commands
+CRASHES = {
+	b"TRUN": (b".", 2006),
+	b"GMON": (b"/", 3950),
+	b"KSTET": (b"", 70),
+}
+
+#Longest line we buffer before treating the input as a crash anyway
+MAX_LINE = 1 << 20
+
+
+class VulnServerSim:
+
+	def __init__(self, host="127.0.0.1", ports=(9999,), filtered=(), slow=(),
+			latency=.1, jitter=0.0, crash_length=None, crash_mode="down", down_for=2.0):
+		self.host = host
+		self.ports = list(ports)
+		self.filtered = list(filtered)
+		self.slow = set(slow)
+		self.latency = latency
+		self.jitter = jitter
+		self.crashes = dict(CRASHES)
+		if crash_length is not None:
+			self.crashes[b"TRUN"] = (b".", crash_length)
+		self.crash_mode = crash_mode
+		self.down_for = down_for
+		self.servers = []
+		self.held = []
+		self.crash_count = 0
+		self.stopped = None
+
+	async def start(self):
+		self.stopped = asyncio.Event()
+		await self.listen()
+		for port in self.filtered:
+			self.hold_filtered(port)
+
+	async def listen(self):
+		for port in self.ports:
+			server = await asyncio.start_server(
+				lambda r, w, port=port: self.handle(r, w, port),
+				self.host, port, reuse_address=True, limit=MAX_LINE)
+			self.servers.append(server)
+
+	def hold_filtered(self, port):
+		#Listen with a backlog of 0 and never accept. Our own connection
+		#fills the accept queue, after which Linux drops incoming SYNs, so
+		#scanners see the port time out exactly like a firewalled one.
+		listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		listener.bind((self.host, port))
+		listener.listen(0)
+		filler = socket.create_connection((self.host, port))
+		self.held.extend([listener, filler])
+
+	def close(self):
+		for server in self.servers:
+			server.close()
+		self.servers = []
+
+	def stop(self):
+		self.close()
+		for sock in self.held:
+			sock.close()
+		self.held = []
+		self.stopped.set()
+
+	async def delay(self, port):
+		if port in self.slow:
+			await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+	async def crash(self, writer):
+		#Simulate the process dying while handling this connection
+		self.crash_count += 1
+		writer.transport.abort()
+		if self.crash_mode == "close" or not self.servers:
+			return
+		self.close()
+		if self.crash_mode == "exit":
+			self.stop()
+			return
+		#"down": stop listening for a while, then come back as if the
+		#target had been restarted
+		await asyncio.sleep(self.down_for)
+		if not self.stopped.is_set() and not self.servers:
+			await self.listen()
+
+	async def handle(self, reader, writer, port):
+		try:
+			await self.delay(port)
+			writer.write(BANNER)
+			await writer.drain()
+			while True:
+				try:
+					line = await reader.readuntil(b"\n")
+				except asyncio.LimitOverrunError:
+					await self.crash(writer)
+					return
+				except asyncio.IncompleteReadError:
+					return
+				command, _, argument = line.rstrip(b"\r\n").partition(b" ")
+				command = command.upper()
+
+				if command in self.crashes:
+					marker, length = self.crashes[command]
+					if marker in argument and len(argument) - argument.find(marker) > length:
+						await self.crash(writer)
+						return
+
+				await self.delay(port)
+				if command == b"HELP":
+					writer.write(HELP)
+				elif command == b"EXIT":
+					writer.write(b"GOODBYE\n")
+					await writer.drain()
+					writer.close()
+					return
+				elif command in REPLIES:
+					writer.write(REPLIES[command])
+				else:
+					writer.write(b"UNKNOWN COMMAND\n")
+				await writer.drain()
+		except (ConnectionError, OSError):
+			pass
+		except asyncio.CancelledError:
+			#Still connected when the simulator exits: end quietly rather
+			#than have asyncio log every cancelled connection
+			pass
+		finally:
+			if not writer.transport.is_closing():
+				writer.close()
+
+
+async def serve(sim):
+	await sim.start()
+	await sim.stopped.wait()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		usage="python vulnserver_sim.py [options]",
+		epilog="EXAMPLE: python vulnserver_sim.py -p 9999,21,80 --filtered 135 --slow 80 --latency .5")
+	parser.add_argument("--host", default="127.0.0.1",
+		help="address to listen on (default: 127.0.0.1)")
+	parser.add_argument("-p", "--ports", default="9999",
+		help="ports that speak the VulnServer protocol (default: 9999)")
+	parser.add_argument("--filtered", default="",
+		help="ports that behave like firewalled ports")
+	parser.add_argument("--slow", default="",
+		help="open ports whose banner and replies are delayed")
+	parser.add_argument("--latency", type=float, default=.1,
+		help="delay in seconds for --slow ports (default: .1)")
+	parser.add_argument("--jitter", type=float, default=0.0,
+		help="random +/- variation added to --latency (default: 0)")
+	parser.add_argument("--crash-length", type=int,
+		help="TRUN argument length (after the '.') that crashes the server (default: 2006)")
+	parser.add_argument("--crash-mode", choices=("close", "down", "exit"), default="down",
+		help="on a crash, only drop the connection, stop listening for --down-for "
+			"seconds, or exit the process (default: down)")
+	parser.add_argument("--down-for", type=float, default=2.0,
+		help="seconds to stay down after a crash in --crash-mode down (default: 2)")
+	args = parser.parse_args()
+
+	try:
+		ports = parse_ports(args.ports)
+		filtered = parse_ports(args.filtered) if args.filtered else []
+		slow = parse_ports(args.slow) if args.slow else []
+	except ValueError as e:
+		parser.error(str(e))
+
+	sim = VulnServerSim(args.host, sorted(set(ports) | set(slow)), filtered, slow,
+		args.latency, args.jitter, args.crash_length, args.crash_mode, args.down_for)
+	try:
+		asyncio.run(serve(sim))
+	except KeyboardInterrupt:
+		pass
+	#Like a crashed process, exit with an error after a crash in exit mode
+	if args.crash_mode == "exit" and sim.crash_count:
+		exit(1)